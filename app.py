@@ -1,18 +1,36 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 from datetime import datetime
 import os
 import base64
+import hashlib
 from io import BytesIO
-from PIL import Image
+from PIL import Image, ImageOps, features
+from concurrent.futures import ThreadPoolExecutor, Future
+from collections import OrderedDict
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
 import json
 import toml
+import threading
+import random
+import bisect
+import queue
+import sqlite3
+import contextlib
+from contextlib import contextmanager
+import time
+import re
+import functools
+import hmac
+import uuid
 
 # ---------------------------------------------------------
 # [긴급 처방] 다크모드 강제 고정 설정 생성
 # ---------------------------------------------------------
+# 서버를 띄울 때 읽는 파일이라, 내용이 바뀌었을 때만 씀 (프로세스당 한 번만 확인)
+@st.cache_resource
 def create_config():
     if not os.path.exists(".streamlit"):
         os.makedirs(".streamlit")
@@ -26,11 +44,20 @@ backgroundColor="#111111"
 secondaryBackgroundColor="#000000"
 textColor="#FFFFFF"
 font="sans serif"
+
+[server]
+enableStaticServing = true
 """
+    try:
+        with open(config_path, encoding="utf-8") as f:
+            if f.read() == config_content.strip():
+                return
+    except OSError:
+        pass
     try:
         with open(config_path, "w", encoding="utf-8") as f:
             f.write(config_content.strip())
-    except:
+    except OSError:
         pass
 
 create_config()
@@ -45,6 +72,206 @@ SHOE_SIZES = [str(s) for s in range(250, 325, 5)]
 STAFF_ROLES = ["감독", "수석코치", "코치", "트레이너", "전력분석", "통역", "매니저", "닥터"]
 CATEGORIES = ["전체보기", "하계용품", "동계용품", "연습복", "유니폼", "양말", "신발"]
 MEMO_CATS = ["팀 연혁", "드래프트", "트레이드", "입/퇴사", "부상/재활", "기타 비고"]
+# 일괄 지급 때 품목마다 사람의 어느 사이즈를 쓸지
+SIZE_FIELDS = {"상의": "top_size", "하의": "bottom_size", "신발": "shoe_size"}
+# 납품서(CSV/엑셀) 일괄 입고 때 알아보는 컬럼 이름
+DELIVERY_COLUMNS = {
+    "date": ["date", "날짜", "입고 날짜", "입고날짜"],
+    "category": ["category", "카테고리", "구분"],
+    "item_name": ["item_name", "품명", "품목"],
+    "size": ["size", "사이즈"],
+    "quantity": ["quantity", "수량", "입고 수량", "입고수량"],
+}
+
+# --- 저장소 설정 ---
+# "sheets": 구글 스프레드시트 (기본)
+# "sqlite": 같이 들어있는 skywalkers_data.db 사용 (네트워크 없이 실행/측정할 때)
+# "sync":   SQLite(SKYWALKERS_SYNC_DB) 에 먼저 저장하고, 백그라운드에서 구글 시트로 복제 (화면은 바로 넘어감).
+#           예제 데이터가 든 skywalkers_data.db 는 테이블 구조만 가져다 쓰고, 내용은 시작할 때 시트에서 받아옴
+# "fake":   fake_gspread 의 메모리 워크북을 구글 시트처럼 씀 (API 호출 수/지연 측정, benchmarks/bench_pages.py)
+STORAGE_BACKEND = os.environ.get("SKYWALKERS_BACKEND", "sheets")
+SQLITE_PATH = os.environ.get("SKYWALKERS_DB", "skywalkers_data.db")
+SYNC_DB_PATH = os.environ.get("SKYWALKERS_SYNC_DB", "skywalkers_sync.db")
+SQLITE_POOL_SIZE = 4
+SYNC_INTERVAL_SEC = 2
+SYNC_BATCH_SIZE = 200
+SYNC_MAX_BACKOFF_SEC = 300
+# 시트에서 직접 고친 내용과 다른 서버가 붙인 행을 로컬로 다시 받아오는 간격(초)
+SYNC_PULL_SEC = int(os.environ.get("SKYWALKERS_SYNC_PULL_SEC", "300"))
+# fake 워크북 크기(지급/입고 기록 행 수), 호출당 지연(ms), 분당 읽기/쓰기 한도(0 이면 없음)
+FAKE_ROWS = int(os.environ.get("SKYWALKERS_FAKE_ROWS", "100"))
+FAKE_LATENCY_MS = float(os.environ.get("SKYWALKERS_FAKE_LATENCY_MS", "0"))
+FAKE_QUOTA_PER_MIN = int(os.environ.get("SKYWALKERS_FAKE_QUOTA", "0"))
+
+# --- 캐시 설정 ---
+# 시트 스냅샷 유효 시간(초). 앱 밖(구글 시트 화면)에서 직접 고친 내용은 이 시간 안에 반영됨
+CACHE_TTL_SEC = int(os.environ.get("SKYWALKERS_CACHE_TTL", "300"))
+# 새 id 는 테이블별로 이 개수만큼 미리 예약해두고 메모리에서 하나씩 꺼내 씀.
+# 워크북에 '_meta' 시트(헤더: table, start, count, token)가 있으면 예약할 때마다 거기에 한 줄씩 붙이고,
+# 시트가 정한 줄 순서대로 구간을 나눠 가지므로 여러 서버(로컬 + 클라우드)가 동시에 예약해도 구간이 겹치지 않음.
+# '_meta' 가 없으면 서버마다 자기가 본 최대 id 다음부터 쓰므로, 동시에 쓰면 id 가 겹칠 수 있음
+ID_BLOCK_SIZE = 50
+META_SHEET = "_meta"
+# 지급/입고 기록은 뒤에 붙기만 하므로, 처음 한 번만 전체를 읽고 이후에는 새로 붙은 행만 읽음.
+# 이 시간이 지나면 (시트에서 직접 고친 옛 기록까지 반영하려고) 한 번 전체를 다시 읽음
+APPEND_ONLY_TABLES = ["logs", "inbound_logs"]
+TAIL_RESYNC_SEC = 3600
+# 지급 시 다른 세션과 수량이 엇갈리면 그 행만 다시 읽어서 이 횟수까지 재시도
+ISSUE_RETRIES = 3
+
+# --- 기록 보관 설정 ---
+# 시즌 경계 이전의 지급/입고 기록은 시트에서 빼서 로컬 Parquet 파일로 옮길 수 있음 (관리 메뉴).
+# 기준일 기본값은 SKYWALKERS_ARCHIVE_BEFORE(YYYY-MM-DD), 없으면 이번 시즌 시작일(SEASON_START_MONTH 월 1일)
+ARCHIVE_DIR = os.environ.get("SKYWALKERS_ARCHIVE_DIR", "archive")
+ARCHIVE_BEFORE = os.environ.get("SKYWALKERS_ARCHIVE_BEFORE", "")
+ARCHIVE_TABLES = APPEND_ONLY_TABLES
+SEASON_START_MONTH = 7
+# 시트에서 지울 때 한 번에 보내는 id 수 (SQLite 쿼리 변수 한도보다 작게)
+ARCHIVE_DELETE_BATCH = 10000
+
+# --- 시트 API 호출 제한 ---
+# 구글 시트 API 기본 한도는 서비스 계정(사용자) 기준 분당 읽기 60회, 쓰기 60회.
+# 한도를 넘기면 429 가 오므로 미리 속도를 맞추고, 그래도 429/5xx 가 오면 지수 백오프 후 재시도
+SHEETS_READS_PER_MIN = int(os.environ.get("SKYWALKERS_READS_PER_MIN", "60"))
+SHEETS_WRITES_PER_MIN = int(os.environ.get("SKYWALKERS_WRITES_PER_MIN", "60"))
+SHEETS_MAX_RETRIES = 5
+SHEETS_MAX_BACKOFF_SEC = 32
+# 페이지가 쓸 테이블을 미리 읽을 때 (일괄 읽기가 없는 백엔드에서) 동시에 돌릴 스레드 수
+PREFETCH_WORKERS = 4
+
+# --- 성능 측정 ---
+# 함수별 호출 수, 걸린 시간 히스토그램, 주고받은 바이트, 오류 수를 프로세스 전체에서 모음.
+# 호출마다 잠금 한 번과 덧셈 몇 번뿐이라 운영에서도 켜둠. 사이드바 관리자 패널과 JSON/Prometheus 로 내보냄.
+# 관리자 패널은 SKYWALKERS_ADMIN_TOKEN (또는 secrets 의 admin_token) 을 정하고 주소 뒤에 ?admin=<토큰> 을 붙여서 염
+METRIC_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+# 정하면 Prometheus 텍스트를 이 파일에 주기적으로 씀 (node_exporter textfile collector 용)
+METRICS_EXPORT_PATH = os.environ.get("SKYWALKERS_METRICS_FILE", "")
+METRICS_EXPORT_SEC = 15
+
+class Metrics:
+    def __init__(self, buckets_ms):
+        self.buckets_ms = buckets_ms
+        self.lock = threading.Lock()
+        self.exported_at = 0.0
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.since = time.time()
+            # 이름 -> {"count", "errors", "sum_ms", "max_ms", "bytes", "hist"}
+            self.ops = {}
+            # (이름, 예외 종류) -> {"count", "last"}: 화면에 띄우거나 삼키고 넘어간 예외
+            self.swallowed = {}
+
+    def observe(self, name, elapsed_ms, size=0, error=False):
+        slot = bisect.bisect_left(self.buckets_ms, elapsed_ms)
+        with self.lock:
+            op = self.ops.get(name)
+            if op is None:
+                op = self.ops[name] = {"count": 0, "errors": 0, "sum_ms": 0.0, "max_ms": 0.0, "bytes": 0, "hist": [0] * (len(self.buckets_ms) + 1)}
+            op["count"] += 1
+            op["errors"] += error
+            op["sum_ms"] += elapsed_ms
+            op["max_ms"] = max(op["max_ms"], elapsed_ms)
+            op["bytes"] += size
+            op["hist"][slot] += 1
+
+    def error(self, name, exc):
+        key = (name, type(exc).__name__)
+        with self.lock:
+            entry = self.swallowed.setdefault(key, {"count": 0, "last": ""})
+            entry["count"] += 1
+            entry["last"] = str(exc)[:200]
+
+    def _quantile(self, op, q):
+        # 히스토그램 칸의 위쪽 경계로 어림 (마지막 칸은 최댓값)
+        target = q * op["count"]
+        seen = 0
+        for bound, n in zip(self.buckets_ms, op["hist"]):
+            seen += n
+            if seen >= target:
+                return min(bound, op["max_ms"])
+        return op["max_ms"]
+
+    def snapshot(self):
+        with self.lock:
+            ops = {name: dict(op, hist=list(op["hist"])) for name, op in self.ops.items()}
+            swallowed = [{"name": name, "type": kind, **entry} for (name, kind), entry in self.swallowed.items()]
+            since = self.since
+        for op in ops.values():
+            op["avg_ms"] = op["sum_ms"] / op["count"]
+            op["p50_ms"] = self._quantile(op, 0.5)
+            op["p95_ms"] = self._quantile(op, 0.95)
+        return {"since": since, "buckets_ms": self.buckets_ms, "ops": ops, "swallowed": swallowed}
+
+    def prometheus(self):
+        snap = self.snapshot()
+        label = lambda value: str(value).replace("\\", "\\\\").replace('"', '\\"')
+        lines = [
+            "# HELP skywalkers_op_duration_seconds Time spent in instrumented functions and Sheets calls.",
+            "# TYPE skywalkers_op_duration_seconds histogram",
+        ]
+        for name, op in sorted(snap["ops"].items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets_ms + [None], op["hist"]):
+                cumulative += n
+                le = "+Inf" if bound is None else f"{bound / 1000:g}"
+                lines.append(f'skywalkers_op_duration_seconds_bucket{{op="{label(name)}",le="{le}"}} {cumulative}')
+            lines.append(f'skywalkers_op_duration_seconds_sum{{op="{label(name)}"}} {op["sum_ms"] / 1000:.6f}')
+            lines.append(f'skywalkers_op_duration_seconds_count{{op="{label(name)}"}} {op["count"]}')
+        lines += ["# HELP skywalkers_op_errors_total Exceptions raised out of instrumented functions.", "# TYPE skywalkers_op_errors_total counter"]
+        lines += [f'skywalkers_op_errors_total{{op="{label(name)}"}} {op["errors"]}' for name, op in sorted(snap["ops"].items())]
+        lines += ["# HELP skywalkers_op_payload_bytes_total Bytes read or written by instrumented functions.", "# TYPE skywalkers_op_payload_bytes_total counter"]
+        lines += [f'skywalkers_op_payload_bytes_total{{op="{label(name)}"}} {op["bytes"]}' for name, op in sorted(snap["ops"].items())]
+        lines += ["# HELP skywalkers_swallowed_errors_total Exceptions caught and shown or ignored instead of raised.", "# TYPE skywalkers_swallowed_errors_total counter"]
+        lines += [f'skywalkers_swallowed_errors_total{{op="{label(e["name"])}",type="{label(e["type"])}"}} {e["count"]}' for e in snap["swallowed"]]
+        return "\n".join(lines) + "\n"
+
+@st.cache_resource
+def init_metrics():
+    return Metrics(METRIC_BUCKETS_MS)
+
+metrics = init_metrics()
+
+def timed(name=None, size=None):
+    # 함수 실행 시간을 metrics 에 기록. size(결과, *인자) 가 있으면 그 바이트 수도 같이 (예외가 빠져나가면 오류로 셈).
+    # st.rerun() 같은 Streamlit 흐름 제어는 Exception 이 아니라서 오류로 안 셈
+    def decorate(fn):
+        op_name = name or fn.__name__
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception:
+                metrics.observe(op_name, (time.perf_counter() - started) * 1000, error=True)
+                raise
+            except BaseException:
+                metrics.observe(op_name, (time.perf_counter() - started) * 1000)
+                raise
+            metrics.observe(op_name, (time.perf_counter() - started) * 1000, size(result, *args, **kwargs) if size else 0)
+            return result
+        return wrapper
+    return decorate
+
+def _result_bytes(result, *args, **kwargs):
+    # DataFrame 은 메모리 크기(문자열 내용까지 세면 느려서 얕게), 문자열/바이트는 길이
+    if isinstance(result, pd.DataFrame):
+        return int(result.memory_usage(index=False).sum())
+    if isinstance(result, (str, bytes)):
+        return len(result)
+    return 0
+
+def _payload_bytes(value):
+    return len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+
+def _upload_bytes(upload):
+    if upload is None:
+        return 0
+    size = getattr(upload, "size", None)
+    if size is None and hasattr(upload, "getbuffer"):
+        size = upload.getbuffer().nbytes
+    return size or 0
 
 # --- ★★★ [수정됨] 구글 스프레드시트 연결 설정 (안전장치 강화) ★★★ ---
 SCOPE = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
@@ -82,148 +309,2331 @@ def init_connection():
         st.error(f"❌ 연결 중 오류 발생: {e}")
         return None
 
-sh = init_connection()
+# --- 시트 요청 스케줄러 (모든 세션 공유) ---
+# 모든 시트 호출은 여기를 거침: 읽기/쓰기 토큰 버킷으로 속도 제한, 429/5xx 는 지터 섞은 지수 백오프로 재시도,
+# 여러 세션이 같은 읽기를 동시에 하면 한 번만 보내고 결과를 나눠 씀
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+def _status_code(error):
+    # gspread APIError 는 .code, 그 밖의 HTTP 오류는 response.status_code
+    code = getattr(error, "code", None)
+    if code is None:
+        code = getattr(getattr(error, "response", None), "status_code", None)
+    try:
+        return int(code)
+    except (TypeError, ValueError):
+        return None
+
+class RequestScheduler:
+    def __init__(self, reads_per_min, writes_per_min, max_retries=SHEETS_MAX_RETRIES, sleep=time.sleep):
+        self.buckets = {"read": TokenBucket(reads_per_min), "write": TokenBucket(writes_per_min)}
+        self.max_retries = max_retries
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.inflight = {}
+        # 쓰기가 끝날 때마다 올라감. 쓰기 전에 시작한 읽기에 쓰기 후의 요청이 합류하지 않게 키에 넣음
+        self.write_seq = 0
+
+    def _retryable(self, kind, error):
+        code = _status_code(error)
+        if code == 429:
+            return True
+        # 5xx 는 실제로 반영됐을 수도 있어서, 두 번 써질 수 있는 쓰기는 다시 보내지 않음
+        return kind == "read" and code is not None and code >= 500
 
-# --- 데이터베이스 함수 (구글 시트용) ---
-def get_data(sheet_name):
-    if sh:
+    def _run(self, kind, fn):
+        for attempt in range(self.max_retries + 1):
+            self.buckets[kind].acquire()
+            try:
+                return fn()
+            except gspread.exceptions.APIError as e:
+                if attempt == self.max_retries or not self._retryable(kind, e):
+                    raise
+                self.sleep(min(SHEETS_MAX_BACKOFF_SEC, 2 ** attempt) * (0.5 + random.random()))
+
+    def read(self, key, fn):
+        with self.lock:
+            key = (self.write_seq, key)
+            future = self.inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self.inflight[key] = future
+        if not owner:
+            return future.result()
         try:
-            worksheet = sh.worksheet(sheet_name)
-            data = worksheet.get_all_records()
-            df = pd.DataFrame(data)
-            if df.empty and 'id' not in df.columns:
-                return pd.DataFrame(columns=['id'])
-            return df
-        except:
+            future.set_result(self._run("read", fn))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self.lock:
+                self.inflight.pop(key, None)
+        return future.result()
+
+    def write(self, fn):
+        try:
+            return self._run("write", fn)
+        finally:
+            with self.lock:
+                self.write_seq += 1
+
+class ScheduledWorksheet:
+    READS = {"get_all_values", "get_all_records", "get", "batch_get", "row_values", "col_values", "acell", "find"}
+    WRITES = {"append_row", "append_rows", "batch_update", "update", "update_cell", "delete_rows"}
+
+    def __init__(self, worksheet, scheduler):
+        self._ws = worksheet
+        self._scheduler = scheduler
+
+    def __getattr__(self, name):
+        attr = getattr(self._ws, name)
+        if name in self.READS or name in self.WRITES:
+            # 재시도하면 시도마다 한 번씩 기록됨
+            call = timed(f"sheets.{name}")(attr)
+        if name in self.READS:
+            return lambda *args, **kwargs: self._scheduler.read((self._ws.title, name, repr(args), repr(sorted(kwargs.items()))), lambda: call(*args, **kwargs))
+        if name in self.WRITES:
+            return lambda *args, **kwargs: self._scheduler.write(lambda: call(*args, **kwargs))
+        return attr
+
+class ScheduledSpreadsheet:
+    # gspread Spreadsheet 와 같은 모양으로 쓰되, API 를 부르는 메서드만 스케줄러를 거침
+    def __init__(self, spreadsheet, scheduler):
+        self._sh = spreadsheet
+        self._scheduler = scheduler
+
+    def worksheet(self, title):
+        ws = self._scheduler.read(("worksheet", title), lambda: timed("sheets.worksheet")(self._sh.worksheet)(title))
+        return ScheduledWorksheet(ws, self._scheduler)
+
+    def worksheets(self):
+        return [ScheduledWorksheet(ws, self._scheduler) for ws in self._scheduler.read(("worksheets",), timed("sheets.worksheets")(self._sh.worksheets))]
+
+    def values_batch_get(self, ranges, params=None):
+        call = timed("sheets.values_batch_get")(self._sh.values_batch_get)
+        return self._scheduler.read(("values_batch_get", tuple(ranges), repr(params)), lambda: call(ranges, params=params))
+
+    def batch_update(self, body):
+        return self._scheduler.write(lambda: timed("sheets.batch_update")(self._sh.batch_update)(body))
+
+    def __getattr__(self, name):
+        return getattr(self._sh, name)
+
+@st.cache_resource
+def init_scheduler():
+    return RequestScheduler(SHEETS_READS_PER_MIN, SHEETS_WRITES_PER_MIN)
+
+@st.cache_resource
+def init_fake_connection():
+    import fake_gspread
+    return fake_gspread.open_workbook("skywalkers_db", FAKE_ROWS, FAKE_LATENCY_MS / 1000, FAKE_QUOTA_PER_MIN, FAKE_QUOTA_PER_MIN)
+
+if STORAGE_BACKEND == "fake":
+    sh = init_fake_connection()
+else:
+    sh = init_connection() if STORAGE_BACKEND in ("sheets", "sync") else None
+if sh is not None:
+    sh = ScheduledSpreadsheet(sh, init_scheduler())
+
+# --- 테이블 스키마 ---
+# 읽어온 표는 캐시에 넣기 전에 한 번만 형 변환: 사이즈/구분/직책은 순서 있는 Categorical(목록에 없는 값은 뒤에 붙임),
+# id/수량은 작은 정수형, 날짜는 datetime. 사진 컬럼은 그 컬럼을 콕 집어 읽을 때만 메모리에 둠
+SIZE_ORDER = CLOTHES_SIZES + SHOE_SIZES
+SCHEMAS = {
+    "inventory": {"id": "id", "date": "date", "category": CATEGORIES[1:], "size": SIZE_ORDER, "quantity": "int"},
+    "logs": {"id": "id", "date": "date", "target_type": ["선수", "스텝"], "size": SIZE_ORDER, "quantity": "int"},
+    "inbound_logs": {"id": "id", "date": "date", "category": CATEGORIES[1:], "size": SIZE_ORDER, "quantity": "int"},
+    "players": {"id": "id", "top_size": CLOTHES_SIZES, "bottom_size": CLOTHES_SIZES, "shoe_size": SHOE_SIZES},
+    "staff": {"id": "id", "role": STAFF_ROLES, "top_size": CLOTHES_SIZES, "bottom_size": CLOTHES_SIZES, "shoe_size": SHOE_SIZES},
+    "memos": {"id": "id", "date": "date", "category": MEMO_CATS},
+}
+IMAGE_COLUMNS = ["image_path"]
+
+def _categorical(values, order, like=None):
+    # 숫자로 읽힌 사이즈(280, 280.0)도 "280" 으로 맞춘 뒤 변환. like 가 있으면 그 카테고리 순서를 이어받음
+    base = list(like.cat.categories) if like is not None and isinstance(like.dtype, pd.CategoricalDtype) else list(order)
+    known = set(base)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # 이미 변환된 값이면 카테고리 목록만 맞춤
+        extra = sorted(v for v in values.cat.categories if v not in known)
+        return values.cat.set_categories(base + extra, ordered=True)
+    text = values.astype(str).str.strip().str.replace(r"\.0$", "", regex=True)
+    text = text.where(values.notna() & ~text.isin(["", "nan", "None"]))
+    extra = sorted(v for v in text.dropna().unique() if v not in known)
+    return pd.Series(pd.Categorical(text, categories=base + extra, ordered=True), index=values.index)
+
+def _dates(values):
+    text = values.astype(str).str.strip()
+    parsed = pd.to_datetime(text, errors='coerce', format="%Y-%m-%d")
+    retry = parsed.isna() & ~text.isin(["", "nan", "None", "NaT"])
+    if retry.any():
+        parsed[retry] = pd.to_datetime(text[retry], errors='coerce', format="mixed")
+    return parsed
+
+def apply_schema(sheet_name, df, columns=None, like=None):
+    # 이미 변환된 컬럼은 건너뛰므로 여러 번 불러도 됨. columns 가 None(전체 읽기)이면 사진 컬럼은 뺌.
+    # like: 이어붙일 기존 표. Categorical 카테고리를 그 표에 맞춰서 concat 해도 Categorical 이 유지되게 함
+    schema = SCHEMAS.get(sheet_name)
+    if schema is None or not len(df.columns):
+        return df
+    if columns is None:
+        df = df.drop(columns=[c for c in IMAGE_COLUMNS if c in df.columns])
+    df = df.copy(deep=False)
+    for col, kind in schema.items():
+        if col not in df.columns:
+            continue
+        values = df[col]
+        if kind == "id":
+            if values.dtype == "int32":
+                continue
+            ids = pd.to_numeric(values, errors='coerce')
+            if ids.isna().any():
+                # id 가 빈 줄(시트 중간의 빈 행 등)은 데이터가 아님
+                df = df[ids.notna()]
+                ids = ids[ids.notna()]
+            df[col] = ids.astype('int32')
+        elif kind == "int":
+            if values.dtype != "int32":
+                df[col] = pd.to_numeric(values, errors='coerce').fillna(0).astype('int32')
+        elif kind == "date":
+            if not pd.api.types.is_datetime64_any_dtype(values):
+                df[col] = _dates(values)
+        elif not isinstance(values.dtype, pd.CategoricalDtype) or (like is not None and col in like.columns):
+            df[col] = _categorical(values, kind, like[col] if like is not None and col in like.columns else None)
+    return df
+
+def _align_categories(df, like):
+    # like 의 Categorical 컬럼을 df 의 (더 넓은) 카테고리로 맞춘 복사본
+    like = like.copy(deep=False)
+    for col in df.columns:
+        if col in like.columns and isinstance(df[col].dtype, pd.CategoricalDtype) and df[col].dtype != like[col].dtype:
+            like[col] = like[col].cat.set_categories(df[col].cat.categories)
+    return like
+
+# --- 시트 캐시 (모든 세션 공유) ---
+# 시트별로 DataFrame 스냅샷을 버전과 함께 보관.
+# 쓰기(add/update/delete)가 일어나면 해당 시트 버전을 올려서 스냅샷을 버림.
+# 읽는 도중 쓰기가 끼어들면 버전이 달라지므로 그 결과는 캐시에 넣지 않음.
+class SheetIndex:
+    # id -> 실제 행 번호, 컬럼명 -> 열 번호 (1부터, 1행은 헤더)
+    def __init__(self, header, ids):
+        self.header = {name: i + 1 for i, name in enumerate(header)}
+        self.rows = {str(v): i + 2 for i, v in enumerate(ids) if str(v) != ""}
+        self.last_row = len(ids) + 1
+        self.max_id = max((int(v) for v in ids if str(v).isdigit()), default=0)
+        self.built_at = time.time()
+
+    def appended(self, row_id, row):
+        self.rows[str(row_id)] = row
+        self.last_row = row
+        self.max_id = max(self.max_id, int(row_id))
+
+    def deleted(self, rows):
+        # 지운 행보다 아래에 있던 행은 지운 개수만큼 위로 당겨짐
+        removed = sorted(set(rows))
+        self.rows = {k: r - bisect.bisect_left(removed, r) for k, r in self.rows.items() if r not in removed}
+        self.last_row -= len(removed)
+
+class TableCache:
+    def __init__(self, ttl, prepare=None):
+        self.ttl = ttl
+        # 넣기 전에 표를 다듬는 함수 (화면용 캐시는 apply_schema)
+        self.prepare = prepare
+        self.lock = threading.Lock()
+        self.versions = {}
+        self.snapshots = {}
+        self.indexes = {}
+
+    def version(self, sheet_name):
+        with self.lock:
+            return self.versions.get(sheet_name, 0)
+
+    def _fresh(self, sheet_name, key):
+        snaps = self.snapshots.get(sheet_name, {})
+        snap = snaps.get(key)
+        if snap is None:
+            return None
+        if snap["version"] != self.versions.get(sheet_name, 0) or time.time() - snap["fetched_at"] > self.ttl:
+            del snaps[key]
+            return None
+        return snap
+
+    def _find(self, sheet_name, columns):
+        # 전체 스냅샷이나, 필요한 컬럼을 다 가진 다른 스냅샷 (전체 스냅샷에는 사진 컬럼이 없을 수 있음)
+        full = self._fresh(sheet_name, None)
+        if columns is None or (full is not None and set(columns) <= set(full["df"].columns)):
+            return full
+        for key in list(self.snapshots.get(sheet_name, {})):
+            if key is not None and set(columns) <= set(key):
+                snap = self._fresh(sheet_name, key)
+                if snap is not None:
+                    return snap
+        return None
+
+    def get(self, sheet_name, columns=None):
+        # 찾은 스냅샷에서 필요한 컬럼만 잘라서 줌
+        with self.lock:
+            snap = self._find(sheet_name, columns)
+            if snap is None:
+                return None
+            df = snap["df"]
+            return df if columns is None else df[[c for c in columns if c in df.columns]]
+
+    def derived(self, sheet_name, columns, name, build):
+        # 스냅샷으로 만든 부가 자료(검색 색인 등)를 스냅샷에 붙여서 보관. 스냅샷이 버려지면 같이 버려짐
+        with self.lock:
+            snap = self._find(sheet_name, columns)
+            if snap is None:
+                return None
+            if name in snap["derived"]:
+                return snap["derived"][name]
+        value = build(snap["df"])
+        with self.lock:
+            snap["derived"][name] = value
+        return value
+
+    def put(self, sheet_name, version, df, index=None, columns=None):
+        if self.prepare is not None:
+            df = self.prepare(sheet_name, df, columns)
+        with self.lock:
+            if version != self.versions.get(sheet_name, 0):
+                return False
+            key = None if columns is None else tuple(columns)
+            self.snapshots.setdefault(sheet_name, {})[key] = {"version": version, "df": df, "fetched_at": time.time(), "derived": {}}
+            if index is not None:
+                self.indexes[sheet_name] = index
+            return True
+
+    def invalidate(self, sheet_name):
+        with self.lock:
+            self.versions[sheet_name] = self.versions.get(sheet_name, 0) + 1
+            self.snapshots.pop(sheet_name, None)
+
+    # 인덱스는 쓰기 때마다 직접 고쳐서 유지하고, TTL 이 지나면 다시 읽음
+    def locate(self, sheet_name, row_id):
+        with self.lock:
+            idx = self.indexes.get(sheet_name)
+            if idx is None or time.time() - idx.built_at > self.ttl:
+                return None, None
+            return idx.rows.get(str(row_id)), idx.header
+
+    def header(self, sheet_name):
+        # 헤더는 거의 안 바뀌므로 TTL 과 상관없이 마지막으로 본 것을 씀
+        with self.lock:
+            idx = self.indexes.get(sheet_name)
+            return None if idx is None else idx.header
+
+    def max_id(self, sheet_name):
+        with self.lock:
+            idx = self.indexes.get(sheet_name)
+            return None if idx is None else idx.max_id
+
+    def index_appended(self, sheet_name, row_id, row):
+        with self.lock:
+            idx = self.indexes.get(sheet_name)
+            if idx is None or idx.rows.get(str(row_id)) == row:
+                return
+            if row == idx.last_row + 1:
+                idx.appended(row_id, row)
+            else:
+                # 다른 곳에서 행이 추가/삭제된 것 -> 인덱스를 버리고 다음에 다시 만듦
+                del self.indexes[sheet_name]
+
+    def index_deleted(self, sheet_name, rows):
+        with self.lock:
+            idx = self.indexes.get(sheet_name)
+            if idx is not None:
+                idx.deleted(rows)
+
+    def drop_index(self, sheet_name):
+        with self.lock:
+            self.indexes.pop(sheet_name, None)
+
+@st.cache_resource
+def init_table_cache():
+    return TableCache(CACHE_TTL_SEC, apply_schema)
+
+table_cache = init_table_cache()
+
+# --- id 발급기 (모든 세션 공유) ---
+# 매번 A열 전체를 내려받지 않고, 테이블별 다음 id 를 메모리에 들고 있다가 하나씩 발급.
+class IdAllocator:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.next_id = {}
+        self.block_end = {}
+
+    def allocate(self, sheet_name, floor, taken, reserve):
+        # floor: 시트에서 본 최대 id + 1, taken: 이미 쓰인 id 인지 확인, reserve: 블록 예약
+        with self.lock:
+            new_id = max(self.next_id.get(sheet_name, 1), floor)
+            while taken(new_id):
+                new_id += 1
+            if new_id >= self.block_end.get(sheet_name, 0):
+                start, end = reserve(sheet_name, new_id, ID_BLOCK_SIZE)
+                new_id = max(new_id, start)
+                while taken(new_id):
+                    new_id += 1
+                self.block_end[sheet_name] = end
+            self.next_id[sheet_name] = new_id + 1
+            return new_id
+
+@st.cache_resource
+def init_id_allocator():
+    return IdAllocator()
+
+id_allocator = init_id_allocator()
+
+# --- 저장소 백엔드 ---
+# 페이지는 get_data / add_data / update_row / delete_rows_bulk 만 부르고,
+# 실제 읽기/쓰기는 백엔드가 담당. 새 저장소를 붙이려면 아래 네 메서드만 구현하면 됨.
+class StockConflict(Exception):
+    # 지급하려는 순간 재고 수량이 예상한 값과 달랐음 (다른 세션이 먼저 바꿈). args[0] 은 {id: 현재 수량}
+    pass
+
+class StorageBackend:
+    name = ""
+
+    def fetch(self, sheet_name):
+        # (DataFrame, SheetIndex 또는 None) 반환
+        raise NotImplementedError
+
+    def fetch_columns(self, sheet_name, columns):
+        # 필요한 컬럼만 읽기. 따로 구현하지 않은 백엔드는 전체를 읽어서 잘라냄
+        df, index = self.fetch(sheet_name)
+        return df[[c for c in columns if c in df.columns]], index
+
+    def fetch_many(self, requests):
+        # [(시트, 컬럼 목록 또는 None)] 을 한꺼번에 읽음. [(시트, 캐시 키로 쓸 컬럼, df, index)] 반환.
+        # 기본은 스레드 풀로 동시에 읽고, 실패한 시트는 빼고 돌려줌
+        def read(sheet_name, columns):
+            df, index = self.fetch(sheet_name) if columns is None else self.fetch_columns(sheet_name, columns)
+            return sheet_name, columns, df, index
+        with ThreadPoolExecutor(max_workers=PREFETCH_WORKERS) as pool:
+            futures = [pool.submit(read, sheet_name, columns) for sheet_name, columns in requests]
+        return [f.result() for f in futures if f.exception() is None]
+
+    def fetch_tail(self, sheet_name, n_rows, last_id):
+        # 마지막으로 본 행(n_rows 번째, id=last_id) 뒤에 붙은 행만 DataFrame 으로 반환.
+        # 중간에 행이 지워져서 위치가 안 맞으면 None (전체를 다시 읽어야 함)
+        return None
+
+    def append(self, sheet_name, row_data):
+        # 행을 추가하고 새 id 반환 (row_data 에는 id 를 뺀 나머지 컬럼)
+        raise NotImplementedError
+
+    def append_many(self, sheet_name, rows):
+        # 여러 행을 추가하고 새 id 목록 반환. 따로 구현하지 않은 백엔드는 한 행씩 추가
+        return [self.append(sheet_name, list(row)) for row in rows]
+
+    def update_rows(self, sheet_name, updates):
+        # {id: {컬럼: 값}} 을 한 번에 씀. 실제로 쓴 id 목록 반환
+        raise NotImplementedError
+
+    def update_row(self, sheet_name, row_id, changes):
+        # 실제로 쓴 {컬럼: 값} 반환
+        return changes if self.update_rows(sheet_name, {row_id: changes}) else {}
+
+    def delete_rows(self, sheet_name, ids):
+        # 실제로 지운 id 목록 반환
+        raise NotImplementedError
+
+    def read_value(self, sheet_name, row_id, col_name):
+        # 한 행의 한 컬럼만 원본에서 다시 읽음. 행이 없으면 None
+        df, _ = self.fetch_columns(sheet_name, ['id', col_name])
+        match = df[df['id'].astype(str) == str(row_id)]
+        return None if match.empty else match.iloc[0][col_name]
+
+    def issue(self, sheet_name, changes, log_sheet, log_rows):
+        # changes: {id: (expected, new_qty)}. 모든 행의 quantity 가 expected 그대로일 때만 new_qty 로 바꾸고,
+        # 같은 묶음으로 log_rows 를 추가. 새 기록 id 목록 반환. 하나라도 달라져 있으면 아무것도 쓰지 않고 StockConflict
+        raise NotImplementedError
+
+def _cell_value(value):
+    # numpy 숫자(int64 등)는 JSON 으로 못 보내므로 파이썬 기본형으로 변환
+    return value.item() if hasattr(value, "item") else value
+
+def _row_ranges(rows):
+    # [3, 4, 5, 9, 10] -> [(3, 5), (9, 10)]  연속된 행은 하나의 구간으로 합침
+    ranges = []
+    for r in sorted(set(rows)):
+        if ranges and r == ranges[-1][1] + 1:
+            ranges[-1][1] = r
+        else:
+            ranges.append([r, r])
+    return [tuple(x) for x in ranges]
+
+def _quantity(value):
+    # 시트 셀은 "" 이나 "3.0" 으로 올 수도 있음
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+def _cell_data(value):
+    # spreadsheets.batchUpdate 의 CellData. 문자열은 append_row 기본값(RAW)처럼 그대로 넣음
+    value = _cell_value(value)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return {"userEnteredValue": {"stringValue": str(value)}}
+    return {"userEnteredValue": {"numberValue": value}}
+
+def _values_frame(values):
+    # 헤더 포함 2차원 값 목록 -> (DataFrame, SheetIndex). 줄마다 길이가 달라도 헤더 폭에 맞춤
+    header = values[0] if values else []
+    width = len(header)
+    rows = [gspread.utils.numericise_all((r + [""] * (width - len(r)))[:width]) for r in values[1:]]
+    df = pd.DataFrame(rows, columns=header)
+    if df.empty and 'id' not in df.columns:
+        df = pd.DataFrame(columns=['id'])
+    ids = df['id'].tolist() if 'id' in df.columns else []
+    return df, SheetIndex(header, ids)
+
+def _columns_frame(header, columns, blocks):
+    # 열마다 따로 읽은 값 목록(2행부터) -> (DataFrame, SheetIndex). 뒤쪽 빈 칸은 응답에서 빠지므로 채워 넣음
+    n_rows = max((len(block) for block in blocks), default=0)
+    data = {}
+    for col_name, block in zip(columns, blocks):
+        values = [row[0] if row else "" for row in block] + [""] * (n_rows - len(block))
+        data[col_name] = gspread.utils.numericise_all(values)
+    df = pd.DataFrame(data, columns=columns)
+    ids = df['id'].tolist() if 'id' in df.columns else []
+    return df, SheetIndex(list(header), ids)
+
+def _column_letter(col):
+    return gspread.utils.rowcol_to_a1(1, col).rstrip("0123456789")
+
+def _appended_row(response):
+    # append 응답의 updatedRange (예: 'logs'!A22:G22) 에서 실제 행 번호를 꺼냄
+    try:
+        updated = response["updates"]["updatedRange"].split("!")[-1].split(":")[0]
+        return gspread.utils.a1_to_rowcol(updated)[0]
+    except (KeyError, TypeError, IndexError, ValueError):
+        return None
+
+# 구글 스프레드시트. 행 번호는 table_cache 의 SheetIndex 로 찾고, 새 id 는 IdAllocator 로 발급
+class SheetsBackend(StorageBackend):
+    name = "sheets"
+
+    def __init__(self, spreadsheet, cache, allocator):
+        self.sh = spreadsheet
+        self.cache = cache
+        self.allocator = allocator
+        # 시트에는 조건부 쓰기가 없어서, 같은 서버의 세션끼리는 읽기-비교-쓰기를 이 락으로 한 줄로 세움
+        self.issue_lock = threading.Lock()
+        # sh.worksheet() 는 부를 때마다 메타데이터를 읽으므로 한 번 찾은 시트 핸들은 재사용
+        self.worksheets = {}
+        self.worksheets_lock = threading.Lock()
+
+    def _worksheet(self, sheet_name):
+        with self.worksheets_lock:
+            worksheet = self.worksheets.get(sheet_name)
+        if worksheet is None:
+            worksheet = self.sh.worksheet(sheet_name)
+            with self.worksheets_lock:
+                self.worksheets[sheet_name] = worksheet
+        return worksheet
+
+    def fetch(self, sheet_name):
+        # 시트 전체를 한 번 읽어서 스냅샷과 id/헤더 인덱스를 같이 만듦
+        return _values_frame(self._worksheet(sheet_name).get_all_values())
+
+    def fetch_columns(self, sheet_name, columns):
+        # 헤더로 컬럼 위치를 찾아서 해당 열들만 batch_get 한 번으로 읽음
+        header = self.cache.header(sheet_name)
+        if header is None:
+            header = {name: i + 1 for i, name in enumerate(self._worksheet(sheet_name).row_values(1))}
+        columns = [c for c in columns if c in header]
+        blocks = self._worksheet(sheet_name).batch_get([f"{_column_letter(header[c])}2:{_column_letter(header[c])}" for c in columns])
+        return _columns_frame(header, columns, blocks)
+
+    def fetch_many(self, requests):
+        # 여러 시트를 values_batch_get 한 번으로 읽음. 헤더를 아는 시트는 필요한 열만, 모르는 시트는 통째로
+        # (통째로 읽은 건 전체 스냅샷으로 캐시). 없는 시트가 섞여 있으면 일괄 읽기가 실패하므로 시트별로 나눠 읽음
+        ranges, plan = [], []
+        for sheet_name, columns in requests:
+            header = self.cache.header(sheet_name) if columns is not None else None
+            if header is None:
+                plan.append((sheet_name, None, None, len(ranges)))
+                ranges.append(gspread.utils.absolute_range_name(sheet_name))
+            else:
+                cols = [c for c in columns if c in header]
+                plan.append((sheet_name, cols, header, len(ranges)))
+                ranges += [gspread.utils.absolute_range_name(sheet_name, f"{_column_letter(header[c])}2:{_column_letter(header[c])}") for c in cols]
+        try:
+            response = self.sh.values_batch_get(ranges)
+        except gspread.exceptions.APIError as e:
+            metrics.error("fetch_many", e)
+            return super().fetch_many(requests)
+        blocks = [vr.get("values", []) for vr in response.get("valueRanges", [])]
+        results = []
+        for sheet_name, cols, header, start in plan:
+            if cols is None:
+                df, index = _values_frame(blocks[start])
+            else:
+                df, index = _columns_frame(header, cols, blocks[start:start + len(cols)])
+            results.append((sheet_name, cols, df, index))
+        return results
+
+    def fetch_tail(self, sheet_name, n_rows, last_id):
+        # 마지막으로 본 행부터 끝까지 읽어서, 첫 행이 그대로면 그 뒤만 새 행으로 봄
+        header = self.cache.header(sheet_name)
+        if header is None:
+            return None
+        last_col = gspread.utils.rowcol_to_a1(1, len(header)).rstrip("0123456789")
+        values = self._worksheet(sheet_name).get(f"A{n_rows}:{last_col}")
+        expected = str(last_id) if n_rows > 1 else "id"
+        if not values or not values[0] or str(values[0][0]) != expected:
+            return None
+        names = list(header)
+        rows = [gspread.utils.numericise_all(r + [""] * (len(names) - len(r))) for r in values[1:]]
+        return pd.DataFrame(rows, columns=names)
+
+    def _refresh(self, sheet_name):
+        version = self.cache.version(sheet_name)
+        df, index = self.fetch(sheet_name)
+        self.cache.put(sheet_name, version, df, index)
+
+    def _locate(self, sheet_name, row_id):
+        # 로컬 인덱스로 행 번호/헤더를 찾고, 없으면(오래됐으면) 한 번만 다시 읽어서 확인
+        row, header = self.cache.locate(sheet_name, row_id)
+        if row is None:
+            self._refresh(sheet_name)
+            row, header = self.cache.locate(sheet_name, row_id)
+        return row, header
+
+    def _reserve_ids(self, sheet_name, start, count):
+        # '_meta' 시트에 예약 줄 [테이블, 원하는 시작 id, 개수, 토큰] 을 붙이고 전체를 다시 읽음 (쓰기 1번 + 읽기 1번).
+        # 붙인 순서는 시트가 하나로 정해주므로, 모든 서버가 같은 줄들을 같은 순서로 훑어 같은 구간 배분을 얻음.
+        # 읽고 나서 고쳐 쓰는 방식은 두 서버가 같은 값을 읽으면 같은 구간을 가져가서 이렇게 함.
+        # 예전 형식 줄 [테이블, next_id] 는 그 id 부터 쓰라는 뜻으로만 읽음
+        try:
+            meta = self._worksheet(META_SHEET)
+        except gspread.exceptions.WorksheetNotFound:
+            return start, float("inf")
+        token = uuid.uuid4().hex
+        meta.append_row([sheet_name, start, count, token])
+        number = lambda row, i, default: int(row[i]) if len(row) > i and str(row[i]).isdigit() else default
+        cursor = 1
+        for row in meta.get_all_values()[1:]:
+            if not row or row[0] != sheet_name:
+                continue
+            cursor = max(cursor, number(row, 1, 1))
+            if len(row) > 3 and row[3] == token:
+                return cursor, cursor + number(row, 2, 0)
+            cursor += number(row, 2, 0)
+        raise RuntimeError(f"'{META_SHEET}' 시트에서 방금 붙인 id 예약 줄을 찾지 못했습니다.")
+
+    def _next_id(self, sheet_name):
+        floor = self.cache.max_id(sheet_name)
+        if floor is None:
+            self._refresh(sheet_name)
+            floor = self.cache.max_id(sheet_name) or 0
+        taken = lambda candidate: self.cache.locate(sheet_name, candidate)[0] is not None
+        return self.allocator.allocate(sheet_name, floor + 1, taken, self._reserve_ids)
+
+    def append(self, sheet_name, row_data):
+        worksheet = self._worksheet(sheet_name)
+        new_id = self._next_id(sheet_name)
+        row_data.insert(0, new_id)
+        response = worksheet.append_row([_cell_value(v) for v in row_data])
+        row = _appended_row(response)
+        if row is None:
+            self.cache.drop_index(sheet_name)
+        else:
+            self.cache.index_appended(sheet_name, new_id, row)
+        return new_id
+
+    def append_many(self, sheet_name, rows):
+        # id 를 메모리에서 먼저 발급하고 append 한 번으로 추가
+        ids = [self._next_id(sheet_name) for _ in rows]
+        self.append_rows(sheet_name, [[row_id] + list(row) for row_id, row in zip(ids, rows)])
+        return ids
+
+    def existing_ids(self, sheet_name):
+        # A열(id)만 읽어서 문자열 집합으로 (동기화 재시도 때 이미 붙은 행 확인용)
+        return {str(v) for v in self._worksheet(sheet_name).col_values(1)[1:]}
+
+    def append_rows(self, sheet_name, rows):
+        # id 가 이미 들어있는 여러 행을 append 한 번으로 추가 (동기화용)
+        response = self._worksheet(sheet_name).append_rows([[_cell_value(v) for v in row] for row in rows])
+        first = _appended_row(response)
+        if first is None:
+            self.cache.drop_index(sheet_name)
+            return
+        for offset, row in enumerate(rows):
+            self.cache.index_appended(sheet_name, row[0], first + offset)
+
+    def update_rows(self, sheet_name, updates):
+        # {id: {컬럼: 값}} 을 batch_update 한 번으로 씀. 쓰기 전에 행 번호가 아직 그 id 의 행인지 확인. 실제로 쓴 id 목록 반환
+        worksheet = self._worksheet(sheet_name)
+        rows = self._verified_rows(worksheet, sheet_name, list(updates))
+        header = self.cache.header(sheet_name)
+        data = []
+        for row_id, row in rows.items():
+            for col_name, new_value in updates[row_id].items():
+                data.append({"range": gspread.utils.rowcol_to_a1(row, header[col_name]), "values": [[_cell_value(new_value)]]})
+        if data:
+            worksheet.batch_update(data, raw=False)
+        return list(rows)
+
+    def _resolve_rows(self, sheet_name, ids):
+        found = {}
+        for row_id in ids:
+            row, _ = self.cache.locate(sheet_name, row_id)
+            if row is None:
+                break
+            found[row_id] = row
+        else:
+            return found
+        self._refresh(sheet_name)
+        found = {}
+        for row_id in ids:
+            row, _ = self.cache.locate(sheet_name, row_id)
+            if row is not None:
+                found[row_id] = row
+        return found
+
+    def _verified_rows(self, worksheet, sheet_name, ids):
+        # 인덱스로 찾은 행마다 A열(id)을 batch_get 한 번으로 읽어 확인. 다른 id 가 든 행이 있으면(다른 곳에서 행이 지워져
+        # 인덱스가 밀림) 인덱스를 새로 읽고 그 id 들만 한 번 더. {id: 행 번호} 반환 (시트에 없는 id 는 빠짐)
+        verified = {}
+        pending = list(ids)
+        for attempt in range(2):
+            found = self._resolve_rows(sheet_name, pending)
+            if not found:
+                break
+            blocks = worksheet.batch_get([f"A{row}" for row in found.values()])
+            for (row_id, row), block in zip(found.items(), blocks):
+                if block and block[0] and str(block[0][0]) == str(row_id):
+                    verified[row_id] = row
+            pending = [row_id for row_id in found if row_id not in verified]
+            if not pending or attempt:
+                break
+            self._refresh(sheet_name)
+        return verified
+
+    def _rows_match(self, worksheet, found):
+        # 지우기 전에 A열(id)을 구간별로 한 번에 읽어서 인덱스가 맞는지 확인
+        expected = {row: str(row_id) for row_id, row in found.items()}
+        ranges = _row_ranges(found.values())
+        values = worksheet.batch_get([f"A{r0}:A{r1}" for r0, r1 in ranges])
+        for (r0, r1), block in zip(ranges, values):
+            for offset in range(r1 - r0 + 1):
+                cell = block[offset][0] if offset < len(block) and block[offset] else ""
+                if str(cell) != expected[r0 + offset]:
+                    return False
+        return True
+
+    def _read_cells(self, worksheet, sheet_name, ids, col_name):
+        # 인덱스로 찾은 행마다 A열(id)과 대상 칸을 batch_get 한 번으로 읽음. id 가 다르면 인덱스를 고쳐서 한 번 더.
+        # {id: (값, 행 번호)}, 헤더 반환 (못 찾은 id 는 빠짐)
+        for attempt in range(2):
+            found = {}
+            for row_id in ids:
+                row, header = self._locate(sheet_name, row_id)
+                if row is not None:
+                    found[row_id] = row
+            if not found:
+                return {}, None
+            ranges = []
+            for row in found.values():
+                ranges += [f"A{row}", gspread.utils.rowcol_to_a1(row, header[col_name])]
+            blocks = worksheet.batch_get(ranges)
+            cells = {}
+            for i, (row_id, row) in enumerate(found.items()):
+                id_cell, cell = blocks[2 * i], blocks[2 * i + 1]
+                if not (id_cell and id_cell[0] and str(id_cell[0][0]) == str(row_id)):
+                    break
+                cells[row_id] = (cell[0][0] if cell and cell[0] else "", row)
+            else:
+                return cells, header
+            self._refresh(sheet_name)
+        return {}, None
+
+    def read_value(self, sheet_name, row_id, col_name):
+        cells, _ = self._read_cells(self._worksheet(sheet_name), sheet_name, [row_id], col_name)
+        return cells[row_id][0] if row_id in cells else None
+
+    def issue(self, sheet_name, changes, log_sheet, log_rows):
+        # 재고 칸 수정(updateCells)과 기록 추가(appendCells)를 spreadsheets.batchUpdate 한 번으로 보냄 (전부 되거나 전부 안 됨)
+        with self.issue_lock:
+            worksheet = self._worksheet(sheet_name)
+            cells, header = self._read_cells(worksheet, sheet_name, list(changes), 'quantity')
+            missing = [row_id for row_id in changes if row_id not in cells]
+            if missing:
+                raise KeyError(missing[0])
+            conflicts = {row_id: _quantity(cells[row_id][0]) for row_id, (expected, _) in changes.items()
+                         if _quantity(cells[row_id][0]) != expected}
+            if conflicts:
+                raise StockConflict(conflicts)
+            log_ws = self._worksheet(log_sheet)
+            log_ids = [self._next_id(log_sheet) for _ in log_rows]
+            requests = [{"updateCells": {
+                "rows": [{"values": [_cell_data(new_qty)]}],
+                "fields": "userEnteredValue",
+                "start": {"sheetId": worksheet.id, "rowIndex": cells[row_id][1] - 1, "columnIndex": header['quantity'] - 1},
+            }} for row_id, (_, new_qty) in changes.items()]
+            requests.append({"appendCells": {
+                "sheetId": log_ws.id,
+                "rows": [{"values": [_cell_data(v) for v in [log_id] + list(log_row)]} for log_id, log_row in zip(log_ids, log_rows)],
+                "fields": "userEnteredValue",
+            }})
+            self.sh.batch_update({"requests": requests})
+            # appendCells 응답에는 행 번호가 없음. 기록 인덱스는 다음 증분 읽기 때 이어서 맞춰짐
+            return log_ids
+
+    def delete_rows(self, sheet_name, ids):
+        try:
+            worksheet = self._worksheet(sheet_name)
+            found = self._resolve_rows(sheet_name, ids)
+            if found and not self._rows_match(worksheet, found):
+                self._refresh(sheet_name)
+                found = self._resolve_rows(sheet_name, ids)
+                if found and not self._rows_match(worksheet, found):
+                    return []
+            if not found:
+                return []
+
+            # 아래쪽 구간부터 지워야 위쪽 행 번호가 밀리지 않음
+            requests = []
+            for r0, r1 in reversed(_row_ranges(found.values())):
+                requests.append({"deleteDimension": {"range": {"sheetId": worksheet.id, "dimension": "ROWS", "startIndex": r0 - 1, "endIndex": r1}}})
+            self.sh.batch_update({"requests": requests})
+            self.cache.index_deleted(sheet_name, found.values())
+            return [row_id for row_id in ids if row_id in found]
+        except Exception:
+            self.cache.drop_index(sheet_name)
+            raise
+
+# 로컬 SQLite. 커넥션 몇 개를 풀에 만들어두고 돌려 씀 (WAL 이라 읽기와 쓰기가 서로 안 막힘)
+class SQLiteBackend(StorageBackend):
+    name = "sqlite"
+    INDEXES = [
+        "CREATE INDEX IF NOT EXISTS idx_inventory_item ON inventory (item_name, size, category)",
+        "CREATE INDEX IF NOT EXISTS idx_inventory_category ON inventory (category)",
+        "CREATE INDEX IF NOT EXISTS idx_logs_target ON logs (target_name)",
+        "CREATE INDEX IF NOT EXISTS idx_logs_item ON logs (item_name, size)",
+        "CREATE INDEX IF NOT EXISTS idx_inbound_item ON inbound_logs (item_name, size, category)",
+    ]
+
+    def __init__(self, path, pool_size=SQLITE_POOL_SIZE):
+        self.pool = queue.Queue()
+        for _ in range(pool_size):
+            conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.pool.put(conn)
+        with self.connection() as conn:
+            with conn:
+                for sql in self.INDEXES:
+                    conn.execute(sql)
+            tables = [r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")]
+            self.columns = {t: [r[1] for r in conn.execute(f'PRAGMA table_info("{t}")')] for t in tables}
+
+    @contextmanager
+    def connection(self):
+        conn = self.pool.get()
+        try:
+            yield conn
+        finally:
+            self.pool.put(conn)
+
+    def _columns(self, sheet_name, names=None):
+        # 테이블/컬럼 이름은 SQL 에 그대로 들어가므로 실제 스키마에 있는 것만 허용
+        columns = self.columns[sheet_name]
+        for name in names or []:
+            if name not in columns:
+                raise KeyError(name)
+        return columns
+
+    def _after_write(self, conn, sheet_name, op, payload):
+        # 같은 트랜잭션 안에서 불림. 기본 SQLite 는 할 일 없음 (SyncBackend 가 저널 기록)
+        pass
+
+    def fetch(self, sheet_name):
+        return self.fetch_columns(sheet_name, self._columns(sheet_name))
+
+    def fetch_columns(self, sheet_name, columns):
+        columns = [c for c in columns if c in self._columns(sheet_name)]
+        select = ", ".join(f'"{c}"' for c in columns)
+        with self.connection() as conn:
+            df = pd.read_sql_query(f'SELECT {select} FROM "{sheet_name}" ORDER BY id', conn)
+        for col in df.columns:
+            if df[col].dtype.kind not in "iufb":
+                df[col] = df[col].fillna("")
+        return df, None
+
+    def fetch_tail(self, sheet_name, n_rows, last_id):
+        columns = self._columns(sheet_name)
+        with self.connection() as conn:
+            # last_id 까지의 행 수가 그대로여야 중간 삭제가 없었던 것
+            kept = conn.execute(f'SELECT COUNT(*) FROM "{sheet_name}" WHERE id <= ?', (last_id or 0,)).fetchone()[0]
+            if kept != n_rows - 1:
+                return None
+            df = pd.read_sql_query(f'SELECT * FROM "{sheet_name}" WHERE id > ? ORDER BY id', conn, params=(last_id or 0,))
+        for col in df.columns:
+            if df[col].dtype.kind not in "iufb":
+                df[col] = df[col].fillna("")
+        return df[columns]
+
+    def _new_id(self, conn, sheet_name):
+        # 새 행의 id. None 이면 SQLite 가 정함 (지금 최대 id + 1)
+        return None
+
+    def _insert(self, conn, sheet_name, row_data):
+        columns = self._columns(sheet_name)[:len(row_data) + 1]
+        placeholders = ", ".join("?" for _ in columns)
+        names = ", ".join(f'"{c}"' for c in columns)
+        values = [_cell_value(v) for v in row_data]
+        cur = conn.execute(f'INSERT INTO "{sheet_name}" ({names}) VALUES ({placeholders})', [self._new_id(conn, sheet_name)] + values)
+        self._after_write(conn, sheet_name, "append", [[cur.lastrowid] + values])
+        return cur.lastrowid
+
+    def append(self, sheet_name, row_data):
+        with self.connection() as conn:
+            with conn:
+                return self._insert(conn, sheet_name, row_data)
+
+    def append_many(self, sheet_name, rows):
+        with self.connection() as conn:
+            with conn:
+                return [self._insert(conn, sheet_name, list(row)) for row in rows]
+
+    def update_rows(self, sheet_name, updates):
+        for changes in updates.values():
+            self._columns(sheet_name, changes)
+        written = []
+        with self.connection() as conn:
+            with conn:
+                for row_id, changes in updates.items():
+                    assignments = ", ".join(f'"{c}" = ?' for c in changes)
+                    cur = conn.execute(f'UPDATE "{sheet_name}" SET {assignments} WHERE id = ?', [_cell_value(v) for v in changes.values()] + [_cell_value(row_id)])
+                    if cur.rowcount:
+                        written.append(row_id)
+                if written:
+                    self._after_write(conn, sheet_name, "update", [[_cell_value(i), {c: _cell_value(v) for c, v in updates[i].items()}] for i in written])
+        return written
+
+    def delete_rows(self, sheet_name, ids):
+        self._columns(sheet_name)
+        placeholders = ", ".join("?" for _ in ids)
+        params = [_cell_value(i) for i in ids]
+        with self.connection() as conn:
+            with conn:
+                existing = {r[0] for r in conn.execute(f'SELECT id FROM "{sheet_name}" WHERE id IN ({placeholders})', params)}
+                conn.execute(f'DELETE FROM "{sheet_name}" WHERE id IN ({placeholders})', params)
+                if existing:
+                    self._after_write(conn, sheet_name, "delete", sorted(existing))
+        return [row_id for row_id in ids if int(row_id) in existing]
+
+    def read_value(self, sheet_name, row_id, col_name):
+        self._columns(sheet_name, [col_name])
+        with self.connection() as conn:
+            row = conn.execute(f'SELECT "{col_name}" FROM "{sheet_name}" WHERE id = ?', (_cell_value(row_id),)).fetchone()
+        return None if row is None else row[0]
+
+    def issue(self, sheet_name, changes, log_sheet, log_rows):
+        # 행마다 WHERE quantity = expected 로 비교 후 교체. 재고 수정과 기록 추가가 한 트랜잭션 (하나라도 어긋나면 롤백)
+        self._columns(sheet_name, ['quantity'])
+        with self.connection() as conn:
+            with conn:
+                conflicts = {}
+                for row_id, (expected, new_qty) in changes.items():
+                    cur = conn.execute(f'UPDATE "{sheet_name}" SET quantity = ? WHERE id = ? AND quantity = ?',
+                                       (_cell_value(new_qty), _cell_value(row_id), _cell_value(expected)))
+                    if not cur.rowcount:
+                        row = conn.execute(f'SELECT quantity FROM "{sheet_name}" WHERE id = ?', (_cell_value(row_id),)).fetchone()
+                        if row is None:
+                            raise KeyError(row_id)
+                        conflicts[row_id] = _quantity(row[0])
+                if conflicts:
+                    raise StockConflict(conflicts)
+                self._after_write(conn, sheet_name, "update", [[_cell_value(i), {"quantity": _cell_value(q)}] for i, (_, q) in changes.items()])
+                return [self._insert(conn, log_sheet, log_row) for log_row in log_rows]
+
+def _copy_schema(src, dst):
+    # dst 에 없는 테이블을 src 의 CREATE TABLE 문 그대로 만듦 (내용은 안 가져옴)
+    with contextlib.closing(sqlite3.connect(src)) as conn:
+        tables = conn.execute("SELECT name, sql FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'").fetchall()
+    with contextlib.closing(sqlite3.connect(dst)) as conn:
+        with conn:
+            have = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+            for name, sql in tables:
+                if name not in have:
+                    conn.execute(sql)
+
+# SQLite 를 원본으로 쓰고 구글 시트는 백그라운드 복제본으로 둠.
+# 쓰기는 데이터 변경과 저널(_sync_journal) 기록을 한 트랜잭션으로 커밋하고 바로 반환.
+# 워커 스레드가 저널을 순서대로 읽어 테이블별로 묶어서 시트에 반영하고, 실패하면 지수 백오프 후 재시도.
+class SyncBackend(SQLiteBackend):
+    name = "sync"
+    JOURNAL = """CREATE TABLE IF NOT EXISTS _sync_journal (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        table_name TEXT NOT NULL,
+        op TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_error TEXT)"""
+    # 테이블별로 시트에서 마지막으로 받아온 시각과 그때 시트의 최대 id, '_meta' 로 예약해 둔 id 구간 [next_id, block_end).
+    # block_end 가 NULL 이면 끝없음 ('_meta' 시트가 없을 때). 여기 없는 테이블은 아직 시트 내용을 모름
+    STATE = """CREATE TABLE IF NOT EXISTS _sync_state (
+        table_name TEXT PRIMARY KEY,
+        max_id INTEGER NOT NULL,
+        pulled_at REAL NOT NULL,
+        next_id INTEGER,
+        block_end INTEGER)"""
+
+    def __init__(self, path, replica, on_change, schema_from=SQLITE_PATH):
+        _copy_schema(schema_from, path)
+        super().__init__(path)
+        with self.connection() as conn:
+            with conn:
+                conn.execute(self.JOURNAL)
+                conn.execute(self.STATE)
+                have = {r[1] for r in conn.execute("PRAGMA table_info(_sync_state)")}
+                for col in ("next_id", "block_end"):
+                    if col not in have:
+                        conn.execute(f"ALTER TABLE _sync_state ADD COLUMN {col} INTEGER")
+            self.id_floor = {}
+            self.id_blocks = {}
+            for table, max_id, next_id, block_end in conn.execute("SELECT table_name, max_id, next_id, block_end FROM _sync_state"):
+                self.id_floor[table] = max_id
+                if next_id is not None:
+                    self.id_blocks[table] = [next_id, block_end]
+        self.id_lock = threading.Lock()
+        self.columns.pop("_sync_journal", None)
+        self.columns.pop("_sync_state", None)
+        self.replica = replica
+        self.on_change = on_change
+        self.wake = threading.Event()
+        self.blocked_until = {}
+        self.bootstrapped = False
+        self.pulled_at = 0
+        self.last_synced = None
+        self.last_error = None
+
+    def _new_id(self, conn, sheet_name):
+        # 새 id 는 '_meta' 로 예약한 구간에서 꺼냄 (다른 서버와 안 겹침). 로컬과 시트에서 본 최대 id 보다도 크게.
+        # 구간을 다 쓰면 여기서 새로 예약하고, 그때 시트에 닿지 않으면 저장이 실패함 (보통은 워커가 미리 예약해 둠).
+        # 꺼낸 위치는 같은 트랜잭션으로 _sync_state 에 남겨서 다시 시작해도 이어서 씀
+        if self.replica is None:
+            return None
+        if sheet_name not in self.id_floor:
+            raise RuntimeError(f"{sheet_name}: 아직 구글 시트 내용을 받아오지 못해 저장할 수 없습니다. 잠시 후 다시 시도해 주세요.")
+        with self.id_lock:
+            floor = self._min_new_id(conn, sheet_name)
+            block = self.id_blocks.get(sheet_name)
+            if block is None or self._remaining(block, floor) <= 0:
+                block = self._reserve(sheet_name, floor)
+            new_id = max(block[0], floor)
+            block[0] = new_id + 1
+            conn.execute("UPDATE _sync_state SET next_id = ?, block_end = ? WHERE table_name = ?", (block[0], block[1], sheet_name))
+            return new_id
+
+    def _min_new_id(self, conn, sheet_name):
+        local = conn.execute(f'SELECT MAX(id) FROM "{sheet_name}"').fetchone()[0] or 0
+        return max(int(local), self.id_floor[sheet_name]) + 1
+
+    @staticmethod
+    def _remaining(block, floor):
+        return float("inf") if block[1] is None else block[1] - max(block[0], floor)
+
+    def _reserve(self, sheet_name, floor):
+        start, end = self.replica._reserve_ids(sheet_name, floor, ID_BLOCK_SIZE)
+        block = [start, None if end == float("inf") else end]
+        self.id_blocks[sheet_name] = block
+        return block
+
+    def reserve_ahead(self):
+        # 절반 넘게 쓴 id 구간은 워커가 미리 새로 예약해 둠 (쓰는 도중에 시트를 부르지 않게, 시트가 잠깐 안 돼도 저장되게).
+        # 새 구간은 메모리에만 두고 다음 쓰기가 _sync_state 에 남김
+        for sheet_name in list(self.id_blocks):
+            with self.connection() as conn:
+                with self.id_lock:
+                    floor = self._min_new_id(conn, sheet_name)
+                    if self._remaining(self.id_blocks[sheet_name], floor) <= ID_BLOCK_SIZE // 2:
+                        self._reserve(sheet_name, floor)
+
+    def _after_write(self, conn, sheet_name, op, payload):
+        conn.execute("INSERT INTO _sync_journal (table_name, op, payload, created_at) VALUES (?, ?, ?, ?)",
+                     (sheet_name, op, json.dumps(payload, ensure_ascii=False), time.time()))
+        self.wake.set()
+
+    def start(self):
+        # 첫 화면이 예전 로컬 내용으로 뜨지 않게 처음 받아오기는 여기서 기다림. 실패하면 워커가 계속 다시 시도
+        self._bootstrap_once()
+        threading.Thread(target=self._run, name="sheets-sync", daemon=True).start()
+
+    def _bootstrap_once(self):
+        self.pulled_at = time.time()
+        try:
+            self.bootstrap()
+            self.bootstrapped = True
+        except Exception as e:
+            metrics.error("sync_bootstrap", e)
+            self.last_error = f"{'시트 받아오기' if self.bootstrapped else '초기 동기화'} 실패: {e}"
+
+    def _run(self):
+        while True:
+            self.wake.wait(SYNC_INTERVAL_SEC)
+            self.wake.clear()
+            # 처음 받아오기에 실패했으면 매번, 그 뒤로는 SYNC_PULL_SEC 마다 시트 내용을 다시 받아옴
+            if not self.bootstrapped or time.time() - self.pulled_at >= SYNC_PULL_SEC:
+                self._bootstrap_once()
+                if not self.bootstrapped:
+                    continue
+            try:
+                while self.sync_once():
+                    pass
+                self.reserve_ahead()
+            except Exception as e:
+                metrics.error("sync_worker", e)
+                self.last_error = str(e)
+
+    def bootstrap(self):
+        # 테이블마다 시트 내용을 받아옴 (시작할 때, 그 뒤로 SYNC_PULL_SEC 마다). 밀린 저널이 없는 테이블은 로컬 내용을
+        # 시트 내용으로 통째로 바꾸고, 있는 테이블은 로컬이 더 최신이므로 그대로 둠. 어느 쪽이든 시트의 최대 id 를 기억해서 새 id 는 그 위로 냄
+        if self.replica is None:
+            return
+        for sheet_name, columns in self.columns.items():
+            try:
+                df, _ = self.replica.fetch(sheet_name)
+            except gspread.exceptions.WorksheetNotFound:
+                continue
+            ids = pd.to_numeric(df['id'], errors='coerce') if 'id' in df.columns else pd.Series(dtype='float64')
+            floor = max(int(ids.max()) if ids.notna().any() else 0, self.id_floor.get(sheet_name, 0))
+            cols = [c for c in columns if c in df.columns]
+            names = ", ".join(f'"{c}"' for c in cols)
+            placeholders = ", ".join("?" for _ in cols)
+            with self.connection() as conn:
+                with conn:
+                    # 받아오는 사이에 화면에서 쓴 기록이 지워지지 않게 저널 확인과 교체를 한 트랜잭션으로
+                    conn.execute("BEGIN IMMEDIATE")
+                    pending = conn.execute("SELECT COUNT(*) FROM _sync_journal WHERE table_name = ?", (sheet_name,)).fetchone()[0]
+                    if not pending:
+                        conn.execute(f'DELETE FROM "{sheet_name}"')
+                        if cols:
+                            conn.executemany(f'INSERT INTO "{sheet_name}" ({names}) VALUES ({placeholders})',
+                                             [[_cell_value(v) for v in row] for row in df[cols].itertuples(index=False)])
+                    conn.execute("INSERT INTO _sync_state (table_name, max_id, pulled_at) VALUES (?, ?, ?) "
+                                 "ON CONFLICT(table_name) DO UPDATE SET max_id = excluded.max_id, pulled_at = excluded.pulled_at",
+                                 (sheet_name, floor, time.time()))
+            self.id_floor[sheet_name] = floor
+            if not pending:
+                self.on_change(sheet_name)
+
+    def sync_once(self):
+        # 밀린 저널을 한 묶음 처리. 뭔가 반영했으면 True
+        if self.replica is None:
+            return False
+        # 백오프 중인 테이블은 쿼리에서 빼야 그 테이블의 밀린 저널이 한 묶음을 다 차지해도 다른 테이블이 계속 동기화됨
+        now = time.time()
+        blocked = sorted(t for t, until in self.blocked_until.items() if until > now)
+        skip = f"WHERE table_name NOT IN ({', '.join('?' for _ in blocked)}) " if blocked else ""
+        with self.connection() as conn:
+            entries = conn.execute(f"SELECT seq, table_name, op, payload, attempts FROM _sync_journal {skip}ORDER BY seq LIMIT ?",
+                                   blocked + [SYNC_BATCH_SIZE]).fetchall()
+
+        # 테이블별 순서는 지키면서, 같은 작업이 연속되면 하나로 묶음
+        groups = {}
+        for seq, table, op, payload, attempts in entries:
+            runs = groups.setdefault(table, [])
+            if runs and runs[-1]["op"] == op:
+                runs[-1]["seqs"].append(seq)
+                runs[-1]["items"].extend(json.loads(payload))
+                runs[-1]["attempts"] = max(runs[-1]["attempts"], attempts)
+            else:
+                runs.append({"op": op, "seqs": [seq], "items": json.loads(payload), "attempts": attempts})
+
+        progressed = False
+        failed = False
+        for table, runs in groups.items():
+            for run in runs:
+                try:
+                    self._apply(table, run["op"], run["items"], run["attempts"])
+                except Exception as e:
+                    metrics.error("sync_apply", e)
+                    self._failed(table, run, e)
+                    failed = True
+                    break
+                with self.connection() as conn:
+                    with conn:
+                        conn.executemany("DELETE FROM _sync_journal WHERE seq = ?", [(seq,) for seq in run["seqs"]])
+                self.last_synced = time.time()
+                progressed = True
+        if progressed and not failed:
+            self.last_error = None
+        return progressed
+
+    def _apply(self, table, op, items, attempts=0):
+        if op == "append":
+            if attempts:
+                # 지난번 실패가 시트에 이미 써진 뒤였을 수 있음(시간 초과, 5xx). 다시 붙이기 전에 A열을 읽어서 없는 id 만
+                present = self.replica.existing_ids(table)
+                items = [row for row in items if str(row[0]) not in present]
+            if items:
+                self.replica.append_rows(table, items)
+        elif op == "update":
+            merged = {}
+            for row_id, changes in items:
+                merged.setdefault(row_id, {}).update(changes)
+            self.replica.update_rows(table, merged)
+        elif op == "delete":
+            self.replica.delete_rows(table, items)
+
+    def _failed(self, table, run, error):
+        attempts = run["attempts"] + 1
+        delay = min(SYNC_MAX_BACKOFF_SEC, 2 ** attempts) * (0.5 + random.random())
+        self.blocked_until[table] = time.time() + delay
+        self.last_error = f"{table}: {error}"
+        with self.connection() as conn:
+            with conn:
+                conn.executemany("UPDATE _sync_journal SET attempts = ?, last_error = ? WHERE seq = ?",
+                                 [(attempts, str(error), seq) for seq in run["seqs"]])
+
+    def sync_status(self):
+        with self.connection() as conn:
+            pending, oldest = conn.execute("SELECT COUNT(*), MIN(created_at) FROM _sync_journal").fetchone()
+        return {
+            "pending": pending,
+            "lag_sec": time.time() - oldest if oldest else 0,
+            "last_synced": self.last_synced,
+            "last_error": self.last_error,
+        }
+
+@st.cache_resource
+def init_backend(kind, _spreadsheet):
+    if kind == "sqlite":
+        return SQLiteBackend(SQLITE_PATH)
+    if kind == "sync":
+        # 복제용 시트 백엔드는 화면용 캐시와 섞이지 않게 자기 캐시/id 발급기를 따로 씀
+        replica = SheetsBackend(_spreadsheet, TableCache(CACHE_TTL_SEC), IdAllocator()) if _spreadsheet else None
+        backend = SyncBackend(SYNC_DB_PATH, replica, init_table_cache().invalidate)
+        backend.start()
+        return backend
+    if _spreadsheet:
+        return SheetsBackend(_spreadsheet, init_table_cache(), init_id_allocator())
+    return None
+
+db = init_backend(STORAGE_BACKEND, sh)
+
+# --- 기록 테이블 증분 동기화 (모든 세션 공유) ---
+# 테이블별로 id 내림차순 정렬된 DataFrame 과, 마지막으로 본 행 위치(n_rows, 헤더 포함)/id 를 기억.
+class TailCache:
+    def __init__(self):
+        # 잠금은 테이블마다 따로 (시트를 읽는 동안 잡고 있으므로, 한 테이블이 느려도 다른 테이블은 안 기다리게)
+        self.lock = threading.Lock()
+        self.table_locks = {}
+        self.states = {}
+        # 전체를 다시 읽거나 중간 행이 빠질 때마다 올라감. 같은 세대 안에서는 뒤에 행이 붙기만 함
+        self.generations = {}
+
+    def _lock(self, sheet_name):
+        with self.lock:
+            return self.table_locks.setdefault(sheet_name, threading.Lock())
+
+    def generation(self, sheet_name):
+        return self.generations.get(sheet_name, 0)
+
+    def sync(self, sheet_name, backend, cache):
+        with self._lock(sheet_name):
+            state = self.states.get(sheet_name)
+            new = None
+            if state is not None and time.time() - state["synced_at"] < TAIL_RESYNC_SEC:
+                new = backend.fetch_tail(sheet_name, state["n_rows"], state["last_id"])
+            if new is None:
+                df, index = backend.fetch(sheet_name)
+                ids = df['id'].tolist() if 'id' in df.columns else []
+                df = apply_schema(sheet_name, df)
+                state = {
+                    "df": df.sort_values(by='id', ascending=False) if len(df) else df,
+                    "ids": ids,
+                    "n_rows": len(ids) + 1,
+                    "last_id": ids[-1] if ids else None,
+                    "synced_at": time.time(),
+                }
+                self.states[sheet_name] = state
+                self.generations[sheet_name] = self.generation(sheet_name) + 1
+                return state["df"], index
+            if not new.empty:
+                new_ids = new['id'].tolist()
+                for offset, row_id in enumerate(new_ids, start=1):
+                    cache.index_appended(sheet_name, row_id, state["n_rows"] + offset)
+                new = apply_schema(sheet_name, new, like=state["df"])
+                state["df"] = pd.concat([new.sort_values(by='id', ascending=False), _align_categories(new, state["df"])], ignore_index=True)
+                state["ids"] = state["ids"] + new_ids
+                state["n_rows"] += len(new_ids)
+                state["last_id"] = new_ids[-1]
+            return state["df"], None
+
+    def deleted(self, sheet_name, ids):
+        # 앱에서 지운 행은 다시 읽지 않고 여기서 바로 빼줌
+        with self._lock(sheet_name):
+            state = self.states.get(sheet_name)
+            if state is None:
+                return
+            removed = {str(i) for i in ids} & {str(i) for i in state["ids"]}
+            if not removed:
+                return
+            state["df"] = state["df"][~state["df"]['id'].astype(str).isin(removed)]
+            state["ids"] = [i for i in state["ids"] if str(i) not in removed]
+            state["n_rows"] -= len(removed)
+            state["last_id"] = state["ids"][-1] if state["ids"] else None
+            self.generations[sheet_name] = self.generation(sheet_name) + 1
+
+    def drop(self, sheet_name):
+        with self._lock(sheet_name):
+            self.states.pop(sheet_name, None)
+
+@st.cache_resource
+def init_tail_cache():
+    return TailCache()
+
+tail_cache = init_tail_cache()
+
+# --- 데이터베이스 함수 ---
+@timed(size=_result_bytes)
+def get_data(sheet_name, columns=None):
+    # columns 를 주면 그 컬럼만 읽음 (id 는 항상 포함). 페이지에 안 쓰는 사진 컬럼 등을 건너뛸 때 사용
+    if db:
+        if columns is not None and 'id' not in columns:
+            columns = ['id'] + list(columns)
+        cached = table_cache.get(sheet_name, columns)
+        if cached is not None:
+            return cached.copy()
+        version = table_cache.version(sheet_name)
+        try:
+            if sheet_name in APPEND_ONLY_TABLES:
+                # 기록 테이블은 새로 붙은 행만 읽어서 정렬된 전체 목록에 이어붙임
+                df, index = tail_cache.sync(sheet_name, db, table_cache)
+                table_cache.put(sheet_name, version, df, index)
+                if columns is not None:
+                    df = df[[c for c in columns if c in df.columns]]
+                return df.copy()
+            if columns is None:
+                df, index = db.fetch(sheet_name)
+            else:
+                df, index = db.fetch_columns(sheet_name, columns)
+        except Exception as e:
+            metrics.error("get_data", e)
+            st.error(f"❌ '{sheet_name}' 불러오기 실패: {e}")
             return pd.DataFrame()
+        df = apply_schema(sheet_name, df, columns)
+        table_cache.put(sheet_name, version, df, index, columns)
+        return df.copy()
     return pd.DataFrame()
 
+@st.cache_resource
+def init_prefetch_pool():
+    return ThreadPoolExecutor(max_workers=PREFETCH_WORKERS)
+
+prefetch_pool = init_prefetch_pool()
+
+@timed()
+def prefetch(tables):
+    # 페이지가 쓸 테이블({시트: 컬럼 목록 또는 None(전체)})을 한꺼번에 읽어서 캐시에 올려둠.
+    # 일반 테이블은 fetch_many 한 번, 기록 테이블은 증분 읽기를 같이 돌려서 왕복 한 번에 끝냄.
+    # 실패한 것은 건너뛰고, 페이지의 get_data 가 다시 읽으면서 오류를 띄움
+    if not db:
+        return
+    requests, tails = [], []
+    for sheet_name, columns in tables.items():
+        if columns is not None and 'id' not in columns:
+            columns = ['id'] + list(columns)
+        if table_cache.get(sheet_name, columns) is not None:
+            continue
+        if sheet_name in APPEND_ONLY_TABLES:
+            tails.append(sheet_name)
+        else:
+            requests.append((sheet_name, columns))
+    versions = {name: table_cache.version(name) for name in tails + [name for name, _ in requests]}
+    futures = {name: prefetch_pool.submit(tail_cache.sync, name, db, table_cache) for name in tails}
+    if requests:
+        try:
+            for sheet_name, columns, df, index in db.fetch_many(requests):
+                table_cache.put(sheet_name, versions[sheet_name], df, index, columns)
+        except Exception as e:
+            metrics.error("prefetch", e)
+    for sheet_name, future in futures.items():
+        if future.exception() is None:
+            df, index = future.result()
+            table_cache.put(sheet_name, versions[sheet_name], df, index)
+        else:
+            metrics.error("prefetch", future.exception())
+
+def get_image_ref(sheet_name, row_id):
+    # 한 사람/품목의 사진 해시만 필요할 때: id + image_path 두 컬럼만 읽어서 캐시
+    df = get_data(sheet_name, ['id', 'image_path'])
+    if df.empty or 'image_path' not in df.columns:
+        return ""
+    match = df[df['id'].astype(str) == str(row_id)]
+    return match.iloc[0]['image_path'] if not match.empty else ""
+
+@timed(size=lambda _, sheet_name, row_data: _payload_bytes(row_data))
 def add_data(sheet_name, row_data):
-    if sh:
-        worksheet = sh.worksheet(sheet_name)
+    # 새 id 반환. 실패하면 화면에 띄우고 None
+    if db:
         try:
-            col_values = worksheet.col_values(1)
-            if len(col_values) > 1:
-                last_val = col_values[-1]
-                last_id = int(last_val) if str(last_val).isdigit() else 0
-            else:
-                last_id = 0
-        except:
-            last_id = 0
-        
-        new_id = last_id + 1
-        row_data.insert(0, new_id)
-        worksheet.append_row(row_data)
+            return db.append(sheet_name, row_data)
+        except Exception as e:
+            metrics.error("add_data", e)
+            st.error(f"❌ 저장 중 오류 발생: {e}")
+            return None
+        finally:
+            table_cache.invalidate(sheet_name)
 
-def update_data(sheet_name, row_id, col_name, new_value):
-    if sh:
-        worksheet = sh.worksheet(sheet_name)
+@timed(size=lambda _, sheet_name, rows: _payload_bytes(rows))
+def add_rows(sheet_name, rows):
+    # 여러 행을 한 번에 추가하고 새 id 목록 반환
+    if db:
+        try:
+            return db.append_many(sheet_name, rows)
+        except Exception as e:
+            metrics.error("add_rows", e)
+            st.error(f"❌ 저장 중 오류 발생: {e}")
+            return []
+        finally:
+            table_cache.invalidate(sheet_name)
+    return []
+
+@timed(size=lambda _, sheet_name, row_id, changes: _payload_bytes(changes))
+def update_row(sheet_name, row_id, changes):
+    # 한 행의 여러 컬럼을 한 번에 수정. 값이 그대로인 컬럼은 건너뜀
+    if not db:
+        return {}
+    cached = table_cache.get(sheet_name, ['id'] + [c for c in changes if c != 'id'])
+    if cached is not None:
+        match = cached[cached['id'].astype(str) == str(row_id)]
+        if not match.empty:
+            current = match.iloc[0]
+            changes = {col: val for col, val in changes.items() if col not in current.index or str(current[col]) != str(val)}
+    if not changes:
+        return {}
+    try:
+        return db.update_row(sheet_name, row_id, changes)
+    except Exception as e:
+        metrics.error("update_row", e)
+        st.error(f"❌ 저장 중 오류 발생: {e}")
+        return {}
+    finally:
+        tail_cache.drop(sheet_name)
+        table_cache.invalidate(sheet_name)
+
+@timed(size=lambda _, sheet_name, updates: _payload_bytes(updates))
+def update_rows(sheet_name, updates):
+    # 여러 행을 한 번에 수정 ({id: {컬럼: 값}}). 실제로 쓴 id 목록 반환
+    if not db or not updates:
+        return []
+    try:
+        return db.update_rows(sheet_name, updates)
+    except Exception as e:
+        metrics.error("update_rows", e)
+        st.error(f"❌ 저장 중 오류 발생: {e}")
+        return []
+    finally:
+        tail_cache.drop(sheet_name)
+        table_cache.invalidate(sheet_name)
+
+@timed()
+def adjust_stock(deltas, log_sheet, log_rows, known=None):
+    # deltas: {재고 id: 증감}. 재고(inventory) 수량 변경과 기록(log_sheet) 추가를 전부 한 묶음으로 씀.
+    # 화면의 수량(known, 없으면 캐시)이 오래됐으면 백엔드가 StockConflict 로 알려주고, 그 행들만 다시 읽은 값으로 재시도.
+    # 성공하면 {id: 바뀐 수량}, 재고 부족이나 오류는 여기서 화면에 띄우고 None
+    if not db or not log_rows:
+        return None
+    expected = dict(known or {})
+    cached = table_cache.get("inventory", ['id', 'quantity'])
+    if cached is not None:
+        current = dict(zip(cached['id'].astype(str), cached['quantity']))
+        for row_id in deltas:
+            if row_id not in expected and str(row_id) in current:
+                expected[row_id] = _quantity(current[str(row_id)])
+    try:
+        for _ in range(ISSUE_RETRIES):
+            for row_id in deltas:
+                if row_id not in expected:
+                    current = db.read_value("inventory", row_id, 'quantity')
+                    if current is None:
+                        st.error("❌ 해당 재고 항목이 삭제되었습니다.")
+                        return None
+                    expected[row_id] = _quantity(current)
+            short = [row_id for row_id, delta in deltas.items() if expected[row_id] + delta < 0]
+            if short:
+                st.error(f"재고 부족 (현재 {expected[short[0]]}개, 필요 {-deltas[short[0]]}개)")
+                return None
+            try:
+                db.issue("inventory", {row_id: (expected[row_id], expected[row_id] + delta) for row_id, delta in deltas.items()}, log_sheet, log_rows)
+                return {row_id: expected[row_id] + delta for row_id, delta in deltas.items()}
+            except StockConflict as e:
+                expected.update(e.args[0])
+                conflict = e
+        # 재시도를 다 써도 계속 어긋나면 마지막 충돌을 오류로 셈
+        metrics.error("adjust_stock", conflict)
+        st.error("❌ 다른 곳에서 같은 재고를 계속 수정하고 있습니다. 잠시 후 다시 시도해주세요.")
+        return None
+    except Exception as e:
+        metrics.error("adjust_stock", e)
+        st.error(f"❌ 저장 중 오류 발생: {e}")
+        return None
+    finally:
+        table_cache.invalidate("inventory")
+        table_cache.invalidate(log_sheet)
+
+def issue_stock_bulk(lines):
+    # lines: [(재고 id, 수량, 지급 기록 행)]. 재고 차감과 지급 기록(logs) 추가를 한 묶음으로. 성공하면 {id: 남은 수량}
+    deltas = {}
+    for row_id, qty, _ in lines:
+        deltas[row_id] = deltas.get(row_id, 0) - qty
+    return adjust_stock(deltas, "logs", [log_row for _, _, log_row in lines])
+
+def issue_stock(row_id, qty, log_row):
+    # 한 품목 지급. 남은 수량 반환 (실패하면 None)
+    left = issue_stock_bulk([(row_id, qty, log_row)])
+    return None if left is None else left[row_id]
+
+def read_delivery(uploaded):
+    # 납품서 CSV/엑셀(.xlsx)을 읽어서 DELIVERY_COLUMNS 의 영문 컬럼명으로 맞춤. 엑셀은 openpyxl 로 읽음
+    # (옛 .xls 는 xlrd 가 따로 필요해서 받지 않음. 엑셀에서 .xlsx 나 CSV 로 다시 저장해서 올림)
+    if uploaded.name.lower().endswith(".xlsx"):
+        df = pd.read_excel(uploaded, dtype=str, engine="openpyxl")
+    else:
+        data = uploaded.getvalue()
         try:
-            cell = worksheet.find(str(row_id), in_column=1)
-            header = worksheet.row_values(1)
-            col_index = header.index(col_name) + 1
-            worksheet.update_cell(cell.row, col_index, new_value)
-        except:
-            pass
+            df = pd.read_csv(BytesIO(data), dtype=str, encoding="utf-8-sig")
+        except UnicodeDecodeError:
+            # 한글 엑셀에서 'CSV 로 저장' 하면 cp949 로 나옴
+            df = pd.read_csv(BytesIO(data), dtype=str, encoding="cp949")
+    names = {}
+    for col in df.columns:
+        key = str(col).strip().lower()
+        for target, aliases in DELIVERY_COLUMNS.items():
+            if key in aliases:
+                names[col] = target
+    return df.rename(columns=names).reindex(columns=list(DELIVERY_COLUMNS))
 
+def plan_inbound(delivery, inventory, default_date):
+    # 납품서를 검사하고 현재 재고와 (구분, 품명, 사이즈)로 한 번에 맞춰봄.
+    # (정상 줄을 날짜/품목별로 합친 것, 품목별 변경 내역[id, current, incoming, after], 잘못된 줄) 반환
+    df = delivery.copy()
+    for col in ['category', 'item_name']:
+        df[col] = df[col].fillna("").astype(str).str.strip()
+    raw_size = df['size'].fillna("").astype(str).str.strip()
+    is_shoe = df['category'] == "신발"
+    clothes = {s.upper(): s for s in CLOTHES_SIZES}
+    df['size'] = raw_size.str.upper().map(clothes).fillna(raw_size).where(~is_shoe, raw_size.str.replace(r"\.0+$", "", regex=True))
+    df['quantity'] = pd.to_numeric(df['quantity'], errors='coerce')
+    df['date'] = pd.to_datetime(df['date'], errors='coerce').dt.strftime("%Y-%m-%d").fillna(default_date)
+
+    df['error'] = ""
+    df.loc[df['quantity'].isna() | (df['quantity'] <= 0) | (df['quantity'] % 1 != 0), 'error'] = "수량 오류"
+    df.loc[~df['size'].isin(SHOE_SIZES).where(is_shoe, df['size'].isin(CLOTHES_SIZES)), 'error'] = "사이즈 오류"
+    df.loc[df['item_name'] == "", 'error'] = "품명 없음"
+    df.loc[~df['category'].isin(CATEGORIES[1:]), 'error'] = "카테고리 오류"
+    invalid = df[df['error'] != ""]
+
+    lines = df[df['error'] == ""].astype({'quantity': 'int64'}).groupby(['date'] + STOCK_KEYS, as_index=False, sort=False)['quantity'].sum()
+    changes = lines.groupby(STOCK_KEYS, as_index=False, sort=False).agg(date=('date', 'min'), incoming=('quantity', 'sum'))
+    stock = _stock_keys(inventory.reindex(columns=['id'] + STOCK_KEYS + ['quantity']), STOCK_KEYS).drop_duplicates(STOCK_KEYS)
+    changes = changes.merge(stock.rename(columns={'quantity': 'current'}), on=STOCK_KEYS, how='left')
+    changes['current'] = changes['current'].map(_quantity).where(changes['id'].notna(), 0).astype('int64')
+    changes['after'] = changes['current'] + changes['incoming']
+    return lines, changes, invalid
+
+def commit_inbound(lines, changes):
+    # 새 품목은 수량 0 으로 먼저 한 번에 추가하고, 수량 변경과 입고 기록은 adjust_stock 한 묶음으로 씀
+    new = changes[changes['id'].isna()]
+    ids = changes['id'].tolist()
+    if not new.empty:
+        new_ids = add_rows("inventory", [[r.date, r.category, r.item_name, r.size, 0, ""] for r in new.itertuples(index=False)])
+        if len(new_ids) != len(new):
+            return None
+        for pos, new_id in zip(new.index, new_ids):
+            ids[changes.index.get_loc(pos)] = new_id
+    ids = [int(i) for i in ids]
+    known = dict(zip(ids, changes['current'].tolist()))
+    log_rows = [[r.date, r.category, r.item_name, r.size, int(r.quantity)] for r in lines.itertuples(index=False)]
+    return adjust_stock(dict(zip(ids, changes['incoming'].tolist())), "inbound_logs", log_rows, known)
+
+def bulk_issue_plan(people, items, inventory, qty):
+    # 사람 x 품목 조합마다 본인 사이즈를 골라서 재고와 한 번에 맞춰봄.
+    # items: [(구분, 품명, 사이즈 컬럼)]. 줄마다 재고 id, 현재 수량(available), 같은 품목/사이즈 총 필요량(demand), 부족 여부(short)
+    plan = people[['name'] + list(SIZE_FIELDS.values())].merge(pd.DataFrame(items, columns=['category', 'item_name', 'size_col']), how='cross')
+    plan['size'] = ""
+    for col in SIZE_FIELDS.values():
+        mask = plan['size_col'] == col
+        plan.loc[mask, 'size'] = plan.loc[mask, col].astype(str)
+    plan = _stock_keys(plan, STOCK_KEYS)
+    plan['quantity'] = qty
+    stock = _stock_keys(inventory, STOCK_KEYS).drop_duplicates(STOCK_KEYS)
+    plan = plan.merge(stock[STOCK_KEYS + ['id', 'quantity']].rename(columns={'quantity': 'available'}), on=STOCK_KEYS, how='left')
+    plan['available'] = pd.to_numeric(plan['available'], errors='coerce').fillna(0).astype('int64')
+    plan['demand'] = plan.groupby(STOCK_KEYS)['quantity'].transform('sum')
+    plan['short'] = plan['id'].isna() | (plan['size'] == "") | (plan['demand'] > plan['available'])
+    return plan
+
+@timed()
+def update_data(sheet_name, row_id, col_name, new_value):
+    update_row(sheet_name, row_id, {col_name: new_value})
+
+@timed()
+def delete_rows_bulk(sheet_name, ids, archived=True):
+    # 여러 id 를 한 번에 삭제. 실제로 지운 id 목록을 돌려줌.
+    # archived: 보관 파일로 옮겨진 기록이면 거기서 지움 (보관 작업이 시트에서 지울 때는 False)
+    if not db or not ids:
+        return []
+    cold = []
+    if archived and sheet_name in ARCHIVE_TABLES:
+        hit = archive.is_archived(sheet_name, ids)
+        if hit.any():
+            try:
+                cold = archive.delete(sheet_name, [row_id for row_id, h in zip(ids, hit) if h])
+            except (ImportError, OSError) as e:
+                metrics.error("delete_rows_bulk", e)
+                st.error(f"❌ 보관된 기록 삭제 중 오류 발생: {e}")
+            ids = [row_id for row_id, h in zip(ids, hit) if not h]
+            if not ids:
+                return cold
+    removed = []
+    try:
+        removed = db.delete_rows(sheet_name, ids)
+        return cold + removed
+    except Exception as e:
+        metrics.error("delete_rows_bulk", e)
+        st.error(f"❌ 삭제 중 오류 발생: {e}")
+        return cold
+    finally:
+        tail_cache.deleted(sheet_name, removed)
+        table_cache.invalidate(sheet_name)
+
+@timed()
 def delete_data(sheet_name, row_id):
-    if sh:
-        worksheet = sh.worksheet(sheet_name)
+    delete_rows_bulk(sheet_name, [row_id])
+
+# --- 검색 색인 ---
+# 컬럼의 서로 다른 값만 모아서 검색하고, 맞은 값을 가진 행의 id 를 돌려줌.
+# 테이블 스냅샷에 붙여서 캐시하므로 데이터가 바뀔 때만 다시 만듦
+CHOSUNG = "ㄱㄲㄴㄷㄸㄹㅁㅂㅃㅅㅆㅇㅈㅉㅊㅋㅌㅍㅎ"
+
+def _search_pattern(query, prefix=False):
+    # 입력은 정규식이 아니라 글자 그대로 찾음. 초성(ㅂ)은 그 초성으로 시작하는 모든 글자(바~빟)와 맞음
+    parts = []
+    for ch in query.strip().lower():
+        i = CHOSUNG.find(ch)
+        if i >= 0:
+            start = 0xAC00 + i * 588
+            parts.append(f"[{ch}{chr(start)}-{chr(start + 587)}]")
+        else:
+            parts.append(re.escape(ch))
+    return re.compile(("^" if prefix else "") + "".join(parts))
+
+class SearchIndex:
+    def __init__(self, df, col):
+        self.codes, values = pd.factorize(df[col].astype(str))
+        self.values = [v.lower() for v in values]
+        self.ids = df['id'].to_numpy()
+
+    def search(self, query, prefix=False):
+        pattern = _search_pattern(query, prefix)
+        hit = np.fromiter((pattern.search(v) is not None for v in self.values), dtype=bool, count=len(self.values))
+        return self.ids[hit[self.codes]]
+
+def search_ids(sheet_name, col, query, prefix=False):
+    # 품명/이름 검색. 부분 문자열, 앞부분(prefix), 초성("ㅂㅍㅌ" -> 반팔티) 모두 됨. 맞는 행의 id 배열
+    columns = ['id', col]
+    build = lambda df: SearchIndex(df, col)
+    index = table_cache.derived(sheet_name, columns, ("search", col), build)
+    if index is None:
+        # 스냅샷이 없거나 만료됨 -> 한 번 읽어서 캐시에 올린 뒤 다시 (캐시에 못 올렸으면 이번만 만들어 씀)
+        df = get_data(sheet_name, columns)
+        if df.empty or col not in df.columns:
+            return np.array([])
+        index = table_cache.derived(sheet_name, columns, ("search", col), build) or build(df)
+    return index.search(query, prefix)
+
+# --- 재고 장부 (모든 세션 공유) ---
+# 재고 = 입고 기록 합계 - 지급 기록 합계 (구분, 품명, 사이즈별).
+# 기록 테이블에 새 행이 붙으면 그 행만 합계에 더하고, 기록이 고쳐지거나 지워졌을 때만 처음부터 다시 집계.
+# 지급 기록(logs)에는 구분이 없어서 같은 품명/사이즈의 입고 기록에서 구분을 가져옴
+STOCK_KEYS = ['category', 'item_name', 'size']
+LEDGER_TABLES = {"inbound_logs": STOCK_KEYS, "logs": ['item_name', 'size']}
+
+def _stock_keys(df, keys):
+    # 시트에서 숫자로 읽힌 사이즈(95)와 글자("95")가 다른 품목으로 갈리지 않게 문자열로 맞춤
+    df = df.copy()
+    for col in keys:
+        df[col] = df[col].astype(object).fillna("").astype(str).str.strip()
+    return df
+
+def _stock_totals(df, keys):
+    df = _stock_keys(df.reindex(columns=keys + ['quantity']), keys)
+    df['quantity'] = pd.to_numeric(df['quantity'], errors='coerce').fillna(0).astype('int64')
+    return df.groupby(keys)['quantity'].sum()
+
+class StockLedger:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.totals = {}
+        self.seen = {}
+        self.view = None
+        # 보관 파일로 옮겨진 기록의 합계 {시트: 합계}. 보관 버전이 바뀔 때만 새로 받음
+        self.cold = {}
+        self.cold_version = None
+
+    def _update(self, sheet_name, df, generation):
+        keys = LEDGER_TABLES[sheet_name]
+        if df.empty or 'id' not in df.columns:
+            self.totals[sheet_name] = _stock_totals(pd.DataFrame(), keys)
+            self.seen[sheet_name] = (generation, None)
+            return True
+        ids = pd.to_numeric(df['id'], errors='coerce')
+        seen = self.seen.get(sheet_name)
+        if seen is not None and seen[0] == generation and seen[1] is not None:
+            new = df[ids > seen[1]]
+            if new.empty:
+                return False
+            self.totals[sheet_name] = self.totals[sheet_name].add(_stock_totals(new, keys), fill_value=0).astype('int64')
+        else:
+            self.totals[sheet_name] = _stock_totals(df, keys)
+        self.seen[sheet_name] = (generation, ids.max())
+        return True
+
+    def refresh(self, frames, cold_version=0, cold_totals=None):
+        # frames: {시트: (기록 DataFrame, 세대)}. cold_totals(): 보관분 합계를 만드는 함수 (버전이 바뀌었을 때만 부름).
+        # 바뀐 게 없으면 만들어둔 표를 그대로 돌려줌
+        with self.lock:
+            changed = [self._update(name, df, gen) for name, (df, gen) in frames.items()]
+            if cold_version != self.cold_version:
+                self.cold = cold_totals() if cold_totals else {}
+                self.cold_version = cold_version
+                changed.append(True)
+            if any(changed) or self.view is None:
+                self.view = self._build()
+            return self.view
+
+    def _total(self, sheet_name):
+        total = self.totals[sheet_name]
+        cold = self.cold.get(sheet_name)
+        return total if cold is None else total.add(cold, fill_value=0).astype('int64')
+
+    def _build(self):
+        inbound = self._total("inbound_logs").rename('inbound').reset_index()
+        issued = self._total("logs").rename('issued').reset_index()
+        cats = inbound[STOCK_KEYS].drop_duplicates(['item_name', 'size'])
+        issued = issued.merge(cats, on=['item_name', 'size'], how='left').fillna({'category': ""})
+        issued = issued.groupby(STOCK_KEYS, as_index=False)['issued'].sum()
+        view = inbound.merge(issued, on=STOCK_KEYS, how='outer')
+        view[['inbound', 'issued']] = view[['inbound', 'issued']].fillna(0).astype('int64')
+        view['stock'] = view['inbound'] - view['issued']
+        return view.sort_values(by=STOCK_KEYS, ignore_index=True)
+
+@st.cache_resource
+def init_stock_ledger():
+    return StockLedger()
+
+stock_ledger = init_stock_ledger()
+
+def get_stock_view():
+    # 구분/품명/사이즈별 입고 합계(inbound), 지급 합계(issued), 재고(stock)
+    # 세대를 먼저 읽어야, 그 사이 기록이 다시 읽혀도 다음 호출에서 전체 재집계로 잡힘
+    # 보관분과 겹치는 시트 행(보관 후 시트에서 아직 못 지운 행)은 빼고 세므로, 보관 버전도 세대에 넣음
+    version = archive.version()
+    frames = {}
+    for name, keys in LEDGER_TABLES.items():
+        generation = (tail_cache.generation(name), version)
+        frames[name] = (archive.live(name, get_data(name, ['id'] + keys + ['quantity'])), generation)
+
+    def cold_totals():
+        totals = {}
+        for name, keys in LEDGER_TABLES.items():
+            try:
+                cold = archive.read(name, columns=['id'] + keys + ['quantity'])
+            except ImportError:
+                st.warning(ARCHIVE_NEEDS_PYARROW)
+                continue
+            if cold is not None:
+                totals[name] = _stock_totals(cold, keys)
+        return totals
+    return stock_ledger.refresh(frames, version, cold_totals)
+
+def reconcile_stock():
+    # inventory 시트의 quantity 와 장부 재고가 다른 품목 (시트에만/장부에만 있는 품목 포함)
+    view = get_stock_view()
+    inv = get_data("inventory", ['id'] + STOCK_KEYS + ['quantity'])
+    inv = _stock_keys(inv.reindex(columns=['id'] + STOCK_KEYS + ['quantity']), STOCK_KEYS)
+    inv['quantity'] = pd.to_numeric(inv['quantity'], errors='coerce')
+    report = inv.merge(view[STOCK_KEYS + ['stock']], on=STOCK_KEYS, how='outer')
+    report['diff'] = report['quantity'].fillna(0) - report['stock'].fillna(0)
+    return report[report['diff'] != 0].reset_index(drop=True)
+
+# --- 기록 보관 (Parquet) ---
+# archive/<테이블>/month=YYYY-MM/part-*.parquet 에 월별로 나눠 저장하고, archive/_index.json 에
+# 테이블별 보관된 id 구간과 월 파티션(행 수, 날짜/id 범위, 파일 목록)을 적어둠.
+# 보관 파일은 한 번 쓰면 안 바뀌고(지울 때는 새 파일로 바꿔 씀) 색인만 보고 필요한 월만 읽음.
+# 읽고 쓰려면 pyarrow 가 필요. 없으면 ImportError 가 나고, 화면은 시트에 있는 기록만 보여줌
+ARCHIVE_NEEDS_PYARROW = "보관된 기록을 읽으려면 pyarrow 가 필요합니다 (pip install pyarrow). 시트에 있는 기록만 보입니다."
+
+def _in_ranges(ids, ranges):
+    # ids 각각이 [(시작, 끝), ...] (정렬, 겹치지 않음) 중 하나에 드는지
+    ids = np.asarray(ids, dtype='int64')
+    if not ranges or not len(ids):
+        return np.zeros(len(ids), dtype=bool)
+    starts = np.array([r[0] for r in ranges], dtype='int64')
+    ends = np.array([r[1] for r in ranges], dtype='int64')
+    slot = np.searchsorted(starts, ids, side='right') - 1
+    return (slot >= 0) & (ids <= ends[np.maximum(slot, 0)])
+
+def _union_ranges(a, b):
+    merged = []
+    for r0, r1 in sorted([tuple(r) for r in a] + [tuple(r) for r in b]):
+        if merged and r0 <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], r1)
+        else:
+            merged.append([r0, r1])
+    return merged
+
+def _remove_from_ranges(ranges, ids):
+    # 구간 목록에서 몇 개 id 를 뺌 (지운 기록 수만큼만 도는 가벼운 작업)
+    ranges = [list(r) for r in ranges]
+    for row_id in sorted(set(ids)):
+        for i, (r0, r1) in enumerate(ranges):
+            if r0 <= row_id <= r1:
+                ranges[i:i + 1] = [r for r in ([r0, row_id - 1], [row_id + 1, r1]) if r[0] <= r[1]]
+                break
+    return ranges
+
+def _archive_frame(df):
+    # 파일에는 Categorical 대신 글자 그대로 (읽을 때 apply_schema 로 다시 맞춤)
+    out = df.copy()
+    for col in out.columns:
+        if isinstance(out[col].dtype, pd.CategoricalDtype):
+            out[col] = out[col].astype(object)
+    return out
+
+def _part_name():
+    # 파일마다 다른 이름. 같은 초에 여러 번 보관/삭제해도 서로 덮어쓰지 않게 시각 뒤에 uuid
+    return f"part-{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex}.parquet"
+
+class ArchiveStore:
+    INDEX = "_index.json"
+
+    def __init__(self, root):
+        self.root = root
+        self.lock = threading.RLock()
+        self.index = {}
+        self.index_version = None
+        # 파일 경로 -> 스키마 적용된 DataFrame. (경로, 컬럼) -> 검색 색인
+        self.frames = {}
+        self.search_indexes = {}
+
+    def _path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    def version(self):
+        # 색인 파일이 바뀔 때마다 바뀜 (다른 프로세스가 보관해도 알아챔). 보관한 적 없으면 0
         try:
-            cell = worksheet.find(str(row_id), in_column=1)
-            worksheet.delete_rows(cell.row)
-        except:
-            pass
+            return os.stat(self._path(self.INDEX)).st_mtime_ns
+        except OSError:
+            return 0
+
+    def _load(self):
+        version = self.version()
+        if version != self.index_version:
+            if version:
+                with open(self._path(self.INDEX), encoding="utf-8") as f:
+                    self.index = json.load(f)
+            else:
+                self.index = {}
+            self.index_version = version
+        return self.index
+
+    def _save(self, index):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self._path(self.INDEX + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.replace(tmp, self._path(self.INDEX))
+        self.index = index
+        self.index_version = self.version()
+
+    def table(self, sheet_name):
+        with self.lock:
+            return self._load().get(sheet_name, {"ids": [], "partitions": {}})
+
+    def is_archived(self, sheet_name, ids):
+        return _in_ranges([int(i) for i in ids], self.table(sheet_name)["ids"])
+
+    def live(self, sheet_name, df):
+        # 시트에서 읽은 기록 중 이미 보관된 id 는 뺌 (보관 후 시트에서 지우다 실패한 경우)
+        ranges = self.table(sheet_name)["ids"]
+        if not ranges or df.empty or 'id' not in df.columns:
+            return df
+        hit = _in_ranges(df['id'], ranges)
+        return df[~hit] if hit.any() else df
+
+    def partitions(self, sheet_name, start=None, end=None):
+        # 기간(Timestamp, None 이면 끝없음)에 걸치는 월 파티션
+        parts = self.table(sheet_name)["partitions"]
+        return [month for month, info in sorted(parts.items())
+                if (start is None or pd.Timestamp(info["max_date"]) >= start) and (end is None or pd.Timestamp(info["min_date"]) <= end)]
+
+    def count(self, sheet_name):
+        return sum(info["rows"] for info in self.table(sheet_name)["partitions"].values())
+
+    def _files(self, sheet_name, start=None, end=None):
+        parts = self.table(sheet_name)["partitions"]
+        return [self._path(sheet_name, f"month={month}", name) for month in self.partitions(sheet_name, start, end) for name in parts[month]["files"]]
+
+    def _read_file(self, sheet_name, path):
+        with self.lock:
+            df = self.frames.get(path)
+        if df is None:
+            df = apply_schema(sheet_name, pd.read_parquet(path))
+            with self.lock:
+                self.frames[path] = df
+        return df
+
+    def read(self, sheet_name, start=None, end=None, columns=None):
+        # 기간에 걸치는 월 파일만 읽어서 합침. 보관분이 없으면 None
+        files = self._files(sheet_name, start, end)
+        if not files:
+            return None
+        frames = [self._read_file(sheet_name, path) for path in files]
+        if columns is not None:
+            frames = [df[[c for c in columns if c in df.columns]] for df in frames]
+        return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+    def search(self, sheet_name, col, query, start=None, end=None):
+        # 기간에 걸치는 파일마다 검색 색인을 만들어 두고 맞는 id 를 모음
+        ids = []
+        for path in self._files(sheet_name, start, end):
+            key = (path, col)
+            with self.lock:
+                index = self.search_indexes.get(key)
+            if index is None:
+                index = SearchIndex(self._read_file(sheet_name, path), col)
+                with self.lock:
+                    self.search_indexes[key] = index
+            ids.append(index.search(query))
+        return np.concatenate(ids) if ids else np.array([], dtype='int64')
+
+    def append(self, sheet_name, df):
+        # 날짜가 있는 기록을 월별 새 파일로 쓰고 색인에 추가. 이미 보관된 id 는 건너뜀. 새로 보관한 id 목록 반환
+        with self.lock:
+            index = json.loads(json.dumps(self._load()))
+            table = index.setdefault(sheet_name, {"ids": [], "partitions": {}})
+            df = df[df['date'].notna() & ~_in_ranges(df['id'], table["ids"])]
+            if df.empty:
+                return []
+            out = _archive_frame(df)
+            for month, part in out.groupby(out['date'].dt.strftime("%Y-%m")):
+                folder = self._path(sheet_name, f"month={month}")
+                os.makedirs(folder, exist_ok=True)
+                name = _part_name()
+                part.to_parquet(os.path.join(folder, name), index=False)
+                info = table["partitions"].setdefault(month, {"rows": 0, "files": []})
+                dates = [part['date'].min().strftime("%Y-%m-%d"), part['date'].max().strftime("%Y-%m-%d")]
+                ids = [int(part['id'].min()), int(part['id'].max())]
+                info["min_date"] = min([info.get("min_date", dates[0]), dates[0]])
+                info["max_date"] = max([info.get("max_date", dates[1]), dates[1]])
+                info["min_id"] = min(info.get("min_id", ids[0]), ids[0])
+                info["max_id"] = max(info.get("max_id", ids[1]), ids[1])
+                info["rows"] += len(part)
+                info["files"].append(name)
+            archived = [int(i) for i in df['id']]
+            table["ids"] = _union_ranges(table["ids"], _row_ranges(archived))
+            self._save(index)
+            return archived
+
+    def delete(self, sheet_name, ids):
+        # 지울 id 가 든 파일만 그 행을 뺀 새 파일로 바꿔 씀. 실제로 지운 id 목록 반환
+        targets = {int(i) for i in ids}
+        with self.lock:
+            index = json.loads(json.dumps(self._load()))
+            table = index.get(sheet_name)
+            if table is None or not targets:
+                return []
+            removed, replaced = [], []
+            for month, info in list(table["partitions"].items()):
+                if not any(info["min_id"] <= i <= info["max_id"] for i in targets):
+                    continue
+                for name in list(info["files"]):
+                    path = self._path(sheet_name, f"month={month}", name)
+                    df = self._read_file(sheet_name, path)
+                    hit = df['id'].isin(targets)
+                    if not hit.any():
+                        continue
+                    removed += [int(i) for i in df.loc[hit, 'id']]
+                    info["files"].remove(name)
+                    replaced.append(path)
+                    keep = df[~hit]
+                    if not keep.empty:
+                        new_name = _part_name()
+                        _archive_frame(keep).to_parquet(self._path(sheet_name, f"month={month}", new_name), index=False)
+                        info["files"].append(new_name)
+                    info["rows"] -= int(hit.sum())
+                if not info["files"]:
+                    del table["partitions"][month]
+            if not removed:
+                return []
+            table["ids"] = _remove_from_ranges(table["ids"], removed)
+            self._save(index)
+            for path in replaced:
+                self.frames.pop(path, None)
+                for key in [k for k in self.search_indexes if k[0] == path]:
+                    del self.search_indexes[key]
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    metrics.error("archive_delete", e)
+            return removed
+
+@st.cache_resource
+def init_archive():
+    return ArchiveStore(ARCHIVE_DIR)
+
+archive = init_archive()
+
+def default_archive_before():
+    if ARCHIVE_BEFORE:
+        return datetime.strptime(ARCHIVE_BEFORE, "%Y-%m-%d").date()
+    today = datetime.now().date()
+    return today.replace(year=today.year if today.month >= SEASON_START_MONTH else today.year - 1, month=SEASON_START_MONTH, day=1)
+
+@timed()
+def archive_logs(before):
+    # before(Timestamp) 이전 지급/입고 기록을 보관 파일로 옮기고 시트에서 지움. {테이블: 옮긴 행 수}.
+    # 파일/색인을 먼저 쓰고 시트에서 지우므로, 중간에 끊겨도 다음 실행이 남은 행을 마저 지움
+    moved = {}
+    for sheet_name in ARCHIVE_TABLES:
+        df = get_data(sheet_name)
+        if df.empty or 'date' not in df.columns:
+            continue
+        archived = archive.append(sheet_name, df[df['date'] < before])
+        leftover = df.loc[archive.is_archived(sheet_name, df['id']), 'id'].tolist()
+        for i in range(0, len(leftover), ARCHIVE_DELETE_BATCH):
+            delete_rows_bulk(sheet_name, leftover[i:i + ARCHIVE_DELETE_BATCH], archived=False)
+        moved[sheet_name] = len(archived)
+    return moved
+
+def history_frame(sheet_name, columns, start=None, end=None):
+    # 시트의 최근 기록 + 기간(start~end)에 걸친 보관분. id 내림차순
+    hot = get_data(sheet_name, columns)
+    try:
+        cold = archive.read(sheet_name, start, end, columns)
+    except ImportError:
+        st.warning(ARCHIVE_NEEDS_PYARROW)
+        cold = None
+    if cold is None or cold.empty:
+        return hot
+    hot = archive.live(sheet_name, hot)
+    cold = apply_schema(sheet_name, cold, like=hot)
+    df = pd.concat([_align_categories(cold, hot), cold], ignore_index=True)
+    return df.sort_values(by='id', ascending=False, ignore_index=True)
+
+def search_history(sheet_name, col, query, start=None, end=None):
+    ids = search_ids(sheet_name, col, query)
+    try:
+        cold = archive.search(sheet_name, col, query, start, end)
+    except ImportError:
+        return ids
+    return np.concatenate([ids, cold]) if len(cold) else ids
 
 # --- 이미지 처리 함수 ---
-def image_to_base64(image_file):
+# 사진은 시트 셀에 base64 로 넣지 않고, 로컬 디스크에 내용 해시(sha256) 이름으로 한 번만 저장.
+# 시트의 image_path 에는 64자리 해시만 들어가고, 실제 사진은 화면에 보여줄 때만 읽음.
+# 올릴 때 크기별로 미리 만들어 둠: avatar(지급 화면 카드), preview(수정 화면), full(원본 보기).
+# 올린 원본 바이트는 해시를 돌려주기 전에 <해시>.orig 로 먼저 써두고, 크기별 인코딩이 끝나면 지움
+IMAGE_DIR = os.environ.get("SKYWALKERS_IMAGE_DIR", "images")
+IMAGE_TABLES = ["players", "staff", "inventory"]
+IMAGE_VARIANTS = {"avatar": 120, "preview": 100, "full": 1200}
+IMAGE_QUALITY_PRESETS = {"high": 90, "standard": 80, "low": 65}
+IMAGE_QUALITY = IMAGE_QUALITY_PRESETS[os.environ.get("SKYWALKERS_IMAGE_QUALITY", "standard")]
+# 작은 변형본 포맷. full 은 호환성 때문에 항상 JPEG
+IMAGE_FORMAT = os.environ.get("SKYWALKERS_IMAGE_FORMAT", "WEBP" if features.check("webp") else "JPEG").upper()
+IMAGE_CACHE_MB = 32
+IMAGE_WORKERS = 2
+
+# 디코딩/렌더링한 사진을 메모리 상한 안에서 최근 것만 보관 (모든 세션 공유)
+class ImageLRU:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is not None:
+                self.items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            if key in self.items:
+                self.size -= len(self.items.pop(key))
+            if len(value) > self.max_bytes:
+                return
+            self.items[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                _, old = self.items.popitem(last=False)
+                self.size -= len(old)
+
+# 인코딩은 스레드 풀에서 돌리고, 끝나기 전에 사진을 찾으면 그 작업을 기다림
+class ImagePipeline:
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="image")
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.cache = ImageLRU(IMAGE_CACHE_MB * 1024 * 1024)
+
+    def submit(self, digest, data):
+        with self.lock:
+            future = self.jobs.get(digest)
+            if future is not None:
+                return future
+            future = self.executor.submit(_encode_variants, digest, data)
+            self.jobs[digest] = future
+        # 이미 끝난 작업이면 콜백이 이 스레드에서 바로 불리므로 잠금 밖에서 붙임
+        future.add_done_callback(lambda f: self.done(digest, f))
+        return future
+
+    def done(self, digest, future):
+        with self.lock:
+            if self.jobs.get(digest) is future:
+                del self.jobs[digest]
+
+    def wait(self, digest):
+        with self.lock:
+            future = self.jobs.get(digest)
+        if future is not None:
+            try:
+                future.result()
+            except Exception as e:
+                metrics.error("image_pipeline", e)
+
+@st.cache_resource
+def init_image_pipeline():
+    return ImagePipeline()
+
+image_pipeline = init_image_pipeline()
+
+def _is_image_hash(ref):
+    return len(ref) == 64 and all(c in "0123456789abcdef" for c in ref)
+
+def _image_file(digest, variant="full"):
+    if variant == "full":
+        return os.path.join(IMAGE_DIR, f"{digest}.jpg")
+    return os.path.join(IMAGE_DIR, f"{digest}.{variant}.{IMAGE_FORMAT.lower()}")
+
+def _original_file(digest):
+    return os.path.join(IMAGE_DIR, f"{digest}.orig")
+
+def _write_file(path, data):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def _encode(img, variant):
+    size = IMAGE_VARIANTS[variant]
+    if variant == "avatar":
+        # 동그란 카드에 꽉 차도록 가운데를 정사각형으로 잘라냄
+        out = ImageOps.fit(img, (size, size))
+    else:
+        out = img.copy()
+        out.thumbnail((size, size))
+    buffered = BytesIO()
+    out.save(buffered, format="JPEG" if variant == "full" else IMAGE_FORMAT, quality=IMAGE_QUALITY)
+    return buffered.getvalue()
+
+def _open_rgb(data):
+    img = Image.open(BytesIO(data))
+    return ImageOps.exif_transpose(img).convert('RGB')
+
+def _encode_variants(digest, data):
+    img = _open_rgb(data)
+    # full 을 마지막에 써야 "full 파일이 있으면 인코딩 끝" 으로 판단할 수 있음
+    for variant in sorted(IMAGE_VARIANTS, key=lambda v: v == "full"):
+        _write_file(_image_file(digest, variant), _encode(img, variant))
+    try:
+        os.remove(_original_file(digest))
+    except OSError:
+        pass
+
+@timed(size=lambda _, image_file, wait=False: _upload_bytes(image_file))
+def save_image(image_file, wait=False):
+    # 원본 바이트를 디스크에 쓴 뒤 해시를 돌려주고, 크기별 인코딩은 스레드 풀에서 처리.
+    # 인코딩이 실패하거나 그 전에 앱이 다시 시작돼도 시트에 적힌 해시로 원본을 찾아 다시 만들 수 있음
     if image_file is not None:
         try:
-            img = Image.open(image_file)
-            img = img.convert('RGB')
-            img.thumbnail((300, 300)) 
-            buffered = BytesIO()
-            img.save(buffered, format="JPEG")
-            return base64.b64encode(buffered.getvalue()).decode()
+            data = image_file.getvalue() if hasattr(image_file, "getvalue") else image_file.read()
+            Image.open(BytesIO(data)).verify()
         except Exception as e:
+            metrics.error("save_image", e)
             return ""
+        digest = hashlib.sha256(data).hexdigest()
+        if not os.path.exists(_image_file(digest)):
+            try:
+                if not os.path.exists(_original_file(digest)):
+                    _write_file(_original_file(digest), data)
+            except OSError as e:
+                metrics.error("save_image", e)
+                return ""
+            future = image_pipeline.submit(digest, data)
+            if wait:
+                future.result()
+        return digest
     return ""
 
-def get_local_image_base64(image_path):
-    if os.path.exists(image_path):
-        with open(image_path, "rb") as img_file:
-            return base64.b64encode(img_file.read()).decode()
-    return ""
+def _load_variant(ref, variant):
+    if _is_image_hash(ref):
+        image_pipeline.wait(ref)
+        path = _image_file(ref, variant)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                return f.read()
+        # 이전 버전에서 저장한 파일은 full(.jpg)만 있고, 인코딩이 끝나지 못한 사진은 원본(.orig)만 있으므로
+        # 있는 쪽에서 필요한 크기를 만들어 둠
+        full_path = _image_file(ref)
+        source = full_path if variant != "full" and os.path.exists(full_path) else _original_file(ref)
+        if not os.path.exists(source):
+            return None
+        with open(source, "rb") as f:
+            data = _encode(_open_rgb(f.read()), variant)
+        _write_file(path, data)
+        return data
+    if len(ref) > 50:
+        # 아직 이전 안 된 예전 base64 값
+        raw = base64.b64decode(ref)
+        return raw if variant == "full" else _encode(_open_rgb(raw), variant)
+    return None
+
+def load_image(ref, variant="full"):
+    ref = str(ref or "")
+    cached = image_pipeline.cache.get((ref, variant))
+    if cached is not None:
+        return cached
+    try:
+        data = _load_variant(ref, variant)
+    except Exception as e:
+        metrics.error("load_image", e)
+        return None
+    if data:
+        image_pipeline.cache.put((ref, variant), data)
+    return data
+
+@timed(size=_result_bytes)
+def image_data_uri(ref, variant="avatar"):
+    # HTML 에 바로 넣을 data URI. 인코딩 결과도 캐시에 같이 보관
+    key = (str(ref or ""), variant, "uri")
+    cached = image_pipeline.cache.get(key)
+    if cached is not None:
+        return cached
+    data = load_image(ref, variant)
+    if not data:
+        return ""
+    mime = "image/jpeg" if data[:3] == b"\xff\xd8\xff" else "image/webp" if data[8:12] == b"WEBP" else "image/png"
+    uri = f"data:{mime};base64,{base64.b64encode(data).decode()}"
+    image_pipeline.cache.put(key, uri)
+    return uri
+
+def migrate_images():
+    # [1회용] 시트에 base64 로 들어있던 사진을 파일로 옮기고 해시로 바꿔 씀
+    moved = 0
+    for sheet_name in IMAGE_TABLES:
+        df = get_data(sheet_name, ['id', 'image_path'])
+        if df.empty or 'image_path' not in df.columns:
+            continue
+        updates = {}
+        for row_id, ref in zip(df['id'], df['image_path'].astype(str)):
+            if len(ref) > 50 and not _is_image_hash(ref):
+                try:
+                    digest = save_image(BytesIO(base64.b64decode(ref)), wait=True)
+                except Exception as e:
+                    metrics.error("migrate_images", e)
+                    digest = ""
+                if digest:
+                    updates[row_id] = {"image_path": digest}
+        moved += len(update_rows(sheet_name, updates))
+    return moved
+
+# --- 정적 파일 ---
+# static/ 폴더는 Streamlit 정적 파일 서빙(server.enableStaticServing)으로 app/static/ 주소에서 브라우저가 바로 받아감.
+# 서빙이 꺼져 있을 때(설정 파일을 처음 만든 실행 등)만 메모리에 캐시해둔 내용을 페이지에 직접 넣음
+STATIC_DIR = "static"
+THEME_CSS = "theme.css"
+LOGO_HEIGHT = 60
+
+def static_serving():
+    try:
+        return bool(st.get_option("server.enableStaticServing"))
+    except RuntimeError:
+        return False
+
+def _static_url(name):
+    # 파일이 바뀌면 브라우저 캐시를 새로 받도록 수정 시각을 붙임
+    return f"app/static/{name}?v={int(os.path.getmtime(os.path.join(STATIC_DIR, name)))}"
+
+@st.cache_resource
+def prepare_logo(image_path):
+    # 화면에 보이는 높이(60px)로 한 번만 줄여서 static/ 에 저장. (정적 주소, data URI) 반환
+    if not os.path.exists(image_path):
+        return "", ""
+    name = os.path.basename(image_path)
+    target = os.path.join(STATIC_DIR, name)
+    if not os.path.exists(target) or os.path.getmtime(target) < os.path.getmtime(image_path):
+        with Image.open(image_path) as img:
+            img.thumbnail((img.width, LOGO_HEIGHT), Image.LANCZOS)
+            buf = BytesIO()
+            img.save(buf, format="PNG", optimize=True)
+        _write_file(target, buf.getvalue())
+    with open(target, "rb") as f:
+        data = f.read()
+    return _static_url(name), "data:image/png;base64," + base64.b64encode(data).decode()
+
+def logo_src(image_path):
+    url, data_uri = prepare_logo(image_path)
+    return url if static_serving() else data_uri
+
+@st.cache_resource
+def theme_css():
+    with open(os.path.join(STATIC_DIR, THEME_CSS), encoding="utf-8") as f:
+        return f.read()
+
+def apply_theme():
+    if static_serving():
+        st.markdown(f'<link rel="stylesheet" href="{_static_url(THEME_CSS)}">', unsafe_allow_html=True)
+    else:
+        st.markdown(f"<style>{theme_css()}</style>", unsafe_allow_html=True)
 
 # --- 페이지 설정 ---
 st.set_page_config(page_title="SKYWALKERS V-EQ Manager", page_icon="🏐", layout="wide", initial_sidebar_state="expanded")
 
 # --- [디자인] 스파이더 블랙 테마 ---
-st.markdown("""
-    <style>
-    /* 1. 전체 배경 */
-    .stApp, [data-testid="stAppViewContainer"] { background-color: #111111 !important; }
-    
-    /* 2. 기본 글씨 */
-    h1, h2, h3, h4, h5, h6, p, span, div, label, li, input, textarea, button { color: #FFFFFF !important; }
-
-    /* 3. 사이드바 */
-    [data-testid="stSidebar"] { background-color: #000000 !important; border-right: 1px solid #333333; }
-    [data-testid="stSidebar"] * { color: #FFFFFF !important; }
-    [data-testid="stSidebar"] .stCaption { color: #999999 !important; font-size: 14px !important; }
-
-    /* 4. 입력창 */
-    .stTextInput input, .stSelectbox div[data-baseweb="select"] > div, .stNumberInput input, .stDateInput input, .stTextArea textarea {
-        background-color: #262730 !important; color: #FFFFFF !important; border: 1px solid #444444 !important;
-    }
-    
-    /* 5. 드롭다운 메뉴 (검은 배경 + 흰 글씨) */
-    div[data-baseweb="popover"], ul[data-baseweb="menu"] { 
-        background-color: #262730 !important; 
-        border: 1px solid #444444 !important; 
-    }
-    ul[data-baseweb="menu"] li { 
-        background-color: #262730 !important; 
-        color: #FFFFFF !important; 
-    }
-    ul[data-baseweb="menu"] li:hover, ul[data-baseweb="menu"] li[aria-selected="true"] { 
-        background-color: #003399 !important; 
-        color: #FFFFFF !important; 
-    }
-    div[data-baseweb="select"] span { 
-        color: #FFFFFF !important; 
-    }
-
-    /* 6. 버튼 */
-    .stButton > button { background-color: #003399 !important; color: #FFFFFF !important; border: none !important; font-weight: bold; }
-    .stButton > button:hover { background-color: #FFFFFF !important; color: #003399 !important; }
-
-    /* 7. 표 */
-    [data-testid="stDataFrame"] { background-color: #111111 !important; }
-    [data-testid="stDataFrame"] th { background-color: #003399 !important; color: #FFFFFF !important; }
-    [data-testid="stDataFrame"] td { background-color: #111111 !important; color: #FFFFFF !important; border-bottom: 1px solid #333 !important; }
-
-    /* 8. 확장 패널 */
-    .streamlit-expanderHeader { background-color: #222222 !important; color: #FFFFFF !important; border: 1px solid #444; }
-    .streamlit-expanderContent { background-color: #111111 !important; color: #FFFFFF !important; border-top: 1px solid #444; }
-
-    /* 9. 헤더 로고 박스 */
-    .main-header-container {
-        display: flex; justify-content: space-between; align-items: center;
-        background-color: #FFFFFF !important; padding: 15px 20px; border-radius: 12px; margin-bottom: 20px; border-bottom: 4px solid #003399;
-    }
-    .main-header-container h1 { color: #003399 !important; }
-    .main-header-container p { color: #000000 !important; }
-    .main-header-container span { color: #000000 !important; }
-
-    /* 10. 달력 */
-    div[data-baseweb="calendar"] { background-color: #262730 !important; color: #FFFFFF !important; }
-    div[data-baseweb="calendar"] button { color: #FFFFFF !important; }
-    div[data-baseweb="calendar"] div { color: #FFFFFF !important; }
-    div[data-baseweb="modal"] div { background-color: #222222 !important; color: white !important; }
-    [data-testid="stFileUploader"] section { background-color: #262730 !important; }
-    </style>
-    """, unsafe_allow_html=True)
+# 테마 CSS 는 static/theme.css 에 있음
+apply_theme()
 
 # --- [NEW] 삭제 확인 팝업창 함수 ---
 @st.dialog("🗑️ 삭제 확인")
@@ -234,14 +2644,88 @@ def confirm_delete_dialog(ids, table_name, rerun_callback):
     col_a, col_b = st.columns(2)
     with col_a:
         if st.button("확인 (삭제)", type="primary", use_container_width=True):
-            for row_id in ids:
-                delete_data(table_name, row_id)
-            st.success("삭제되었습니다.")
+            removed = delete_rows_bulk(table_name, ids)
+            if len(removed) == len(ids):
+                st.success("삭제되었습니다.")
+            else:
+                missed = [str(row_id) for row_id in ids if row_id not in removed]
+                st.error(f"{len(removed)}개 삭제, {len(missed)}개 실패 (ID: {', '.join(missed)})")
+                return
             rerun_callback()
     with col_b:
         if st.button("취소", use_container_width=True):
             st.rerun()
 
+# --- 관리자 성능 패널 ---
+def admin_token():
+    token = os.environ.get("SKYWALKERS_ADMIN_TOKEN", "")
+    if not token:
+        try:
+            token = str(st.secrets.get("admin_token", ""))
+        except Exception:
+            token = ""
+    return token
+
+def is_admin():
+    # ?admin=<토큰> 으로 한 번 들어오면 그 세션 동안 유지
+    if not st.session_state.get("admin"):
+        token = admin_token()
+        given = st.query_params.get("admin", "")
+        st.session_state.admin = bool(token) and hmac.compare_digest(given.encode(), token.encode())
+    return st.session_state.admin
+
+def export_metrics():
+    # Prometheus 텍스트 파일을 METRICS_EXPORT_SEC 마다 새로 씀 (다 쓴 뒤 바꿔치기라 읽는 쪽이 반쪽짜리를 안 봄)
+    if not METRICS_EXPORT_PATH or time.time() - metrics.exported_at < METRICS_EXPORT_SEC:
+        return
+    metrics.exported_at = time.time()
+    tmp = f"{METRICS_EXPORT_PATH}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(metrics.prometheus())
+        os.replace(tmp, METRICS_EXPORT_PATH)
+    except OSError as e:
+        metrics.error("export_metrics", e)
+
+def performance_panel():
+    snap = metrics.snapshot()
+    with st.expander("📊 성능 (관리자)"):
+        st.caption(f"{datetime.fromtimestamp(snap['since']).strftime('%m-%d %H:%M')} 부터 · 전체 시간 많이 쓴 순")
+        if snap["ops"]:
+            ops = pd.DataFrame([
+                {"항목": name, "호출": op["count"], "오류": op["errors"], "합계 s": op["sum_ms"] / 1000, "평균 ms": op["avg_ms"],
+                 "p50 ms": op["p50_ms"], "p95 ms": op["p95_ms"], "최대 ms": op["max_ms"], "KB": op["bytes"] / 1024}
+                for name, op in snap["ops"].items()
+            ]).sort_values("합계 s", ascending=False)
+            st.dataframe(ops.round(1), hide_index=True, use_container_width=True)
+        if snap["swallowed"]:
+            st.markdown("**처리된 오류**")
+            errors = pd.DataFrame(snap["swallowed"])[["name", "type", "count", "last"]]
+            errors.columns = ["항목", "종류", "횟수", "마지막 메시지"]
+            st.dataframe(errors, hide_index=True, use_container_width=True)
+        st.download_button("⬇️ JSON", json.dumps(snap, ensure_ascii=False, indent=2), "skywalkers_metrics.json", "application/json", use_container_width=True)
+        st.download_button("⬇️ Prometheus", metrics.prometheus(), "skywalkers_metrics.prom", "text/plain", use_container_width=True)
+        if st.button("🔄 초기화", use_container_width=True):
+            metrics.reset()
+            st.rerun()
+
+# --- 페이지별로 미리 읽을 테이블 ---
+# 페이지가 get_data 로 읽는 컬럼을 테이블별로 합쳐둔 것. 메뉴를 그리기 전에 prefetch 로 한 번에 읽음
+INVENTORY_COLUMNS = ['id', 'category', 'item_name', 'size', 'quantity']
+PEOPLE_COLUMNS = {
+    "players": ['id', 'back_number', 'name', 'top_size', 'bottom_size', 'shoe_size', 'image_path'],
+    "staff": ['id', 'role', 'name', 'top_size', 'bottom_size', 'shoe_size', 'image_path'],
+}
+PAGE_TABLES = {
+    "물품 입고": {"inventory": INVENTORY_COLUMNS},
+    "지급 하기": {"players": PEOPLE_COLUMNS["players"], "staff": PEOPLE_COLUMNS["staff"], "inventory": INVENTORY_COLUMNS},
+    "재고 현황": {"inventory": INVENTORY_COLUMNS, "inbound_logs": None, "logs": None},
+    "선수 명단": {"players": PEOPLE_COLUMNS["players"]},
+    "스텝 명단": {"staff": PEOPLE_COLUMNS["staff"]},
+    "전체 내역": {"logs": None, "inbound_logs": None},
+    "비고/연혁": {"memos": None},
+}
+
 # --- 메인 앱 로직 ---
 def main():
     if 'current_menu' not in st.session_state:
@@ -265,19 +2749,46 @@ def main():
         if st.button("📝 비고/연혁", use_container_width=True): st.session_state.current_menu = "비고/연혁"
         st.markdown("---")
 
+        if db and db.name == "sync":
+            sync = db.sync_status()
+            if sync["pending"]:
+                st.caption(f"🔄 시트 동기화 대기 {sync['pending']}건 (지연 {sync['lag_sec']:.0f}초)")
+            else:
+                st.caption("✅ 구글 시트 동기화 완료")
+            if sync["last_error"]:
+                st.caption(f"⚠️ 마지막 동기화 오류: {sync['last_error']}")
+
+        # 시트에서 기록을 지우거나 사진 경로를 바꾸는 작업이라 관리자(?admin=<토큰>)에게만 보임
+        if is_admin():
+            with st.expander("🛠️ 관리"):
+                if st.button("🖼️ 기존 사진 파일로 이전", use_container_width=True):
+                    st.success(f"사진 {migrate_images()}개 이전 완료")
+                before = st.date_input("보관 기준일 (이전 기록을 시트에서 옮김)", default_archive_before(), key="archive_before")
+                if st.button("🗄️ 기준일 이전 기록 보관", use_container_width=True):
+                    try:
+                        moved = archive_logs(pd.Timestamp(before))
+                        st.success(f"지급 {moved.get('logs', 0)}건 / 입고 {moved.get('inbound_logs', 0)}건 보관 완료")
+                    except ImportError:
+                        st.error("기록을 보관하려면 pyarrow 가 필요합니다 (pip install pyarrow).")
+                    except OSError as e:
+                        st.error(f"❌ 보관 파일을 쓰지 못했습니다: {e}")
+                st.caption(f"🗄️ 보관된 기록: 지급 {archive.count('logs')}건 / 입고 {archive.count('inbound_logs')}건")
+            performance_panel()
+
     header_html = f"""
     <div class="main-header-container">
-        <img src="data:image/png;base64,{get_local_image_base64('logo_skywalkers.png')}" style="height:60px;" alt="Skywalkers">
+        <img src="{logo_src('logo_skywalkers.png')}" style="height:60px;" alt="Skywalkers">
         <div style="text-align:center; flex-grow:1;">
             <h1 style="font-size:2rem; font-weight:900;">HYUNDAI CAPITAL SKYWALKERS</h1>
             <p style="margin:0; font-weight:bold;">EQUIPMENT MANAGEMENT SYSTEM <span>x SPYDER</span></p>
         </div>
-        <img src="data:image/png;base64,{get_local_image_base64('logo_spyder.png')}" style="height:60px;" alt="Spyder">
+        <img src="{logo_src('logo_spyder.png')}" style="height:60px;" alt="Spyder">
     </div>
     """
     st.markdown(header_html, unsafe_allow_html=True)
 
     menu = st.session_state.current_menu
+    prefetch(PAGE_TABLES.get(menu, {}))
     if menu == "물품 입고": page_inbound()
     elif menu == "지급 하기": page_distribute()
     elif menu == "재고 현황": page_inventory()
@@ -285,11 +2796,13 @@ def main():
     elif menu == "스텝 명단": page_staff()
     elif menu == "전체 내역": page_history()
     elif menu == "비고/연혁": page_memo()
+    export_metrics()
 
 # 1. 물품 입고 (구글 시트)
+@timed()
 def page_inbound():
     st.markdown("### 📥 물품 입고 (ADD ITEMS)")
-    if not sh: 
+    if not db: 
         st.warning("⚠️ service_account.json 파일이 없거나 Secrets 설정이 필요합니다.")
         return
     
@@ -308,8 +2821,8 @@ def page_inbound():
 
     if st.button("📥 입고 확정", use_container_width=True):
         if i_name:
-            img_path = image_to_base64(i_img)
-            inv_df = get_data("inventory")
+            img_path = save_image(i_img)
+            inv_df = get_data("inventory", ['id', 'category', 'item_name', 'size', 'quantity'])
             exists = False
             if not inv_df.empty and 'item_name' in inv_df.columns:
                 match = inv_df[(inv_df['item_name'] == i_name) & (inv_df['size'] == i_size) & (inv_df['category'] == i_cat)]
@@ -317,8 +2830,9 @@ def page_inbound():
                     exists = True
                     row_id = match.iloc[0]['id']
                     curr_qty = match.iloc[0]['quantity']
-                    update_data("inventory", row_id, "quantity", int(curr_qty) + int(i_qty))
-                    if img_path: update_data("inventory", row_id, "image_path", img_path)
+                    changes = {"quantity": int(curr_qty) + int(i_qty)}
+                    if img_path: changes["image_path"] = img_path
+                    update_row("inventory", row_id, changes)
 
             if not exists:
                 add_data("inventory", [i_date.strftime("%Y-%m-%d"), i_cat, i_name, i_size, i_qty, img_path])
@@ -327,29 +2841,58 @@ def page_inbound():
             st.success(f"✅ {i_name} ({i_size}) {i_qty}개 입고 및 저장 완료!")
         else: st.error("품명을 입력해주세요.")
 
+    with st.expander("📄 납품서로 일괄 입고 (CSV / 엑셀)"):
+        st.caption("컬럼: 날짜(없으면 위 입고 날짜), 카테고리, 품명, 사이즈, 수량")
+        delivery_file = st.file_uploader("납품서", type=['csv', 'xlsx'], key="delivery_file")
+        if delivery_file is not None:
+            try:
+                delivery = read_delivery(delivery_file)
+            except ImportError:
+                st.error("엑셀 파일을 읽으려면 openpyxl 이 필요합니다 (pip install openpyxl). CSV 로 저장해서 올려도 됩니다.")
+                return
+            except Exception as e:
+                st.error(f"❌ 납품서를 읽지 못했습니다: {e}")
+                return
+            inv_df = get_data("inventory", ['id', 'category', 'item_name', 'size', 'quantity'])
+            lines, changes, invalid = plan_inbound(delivery, inv_df, i_date.strftime("%Y-%m-%d"))
+            if not invalid.empty:
+                st.error(f"⚠️ 잘못된 줄 {len(invalid)}개는 빼고 입고됩니다.")
+                invalid_display = invalid[['category', 'item_name', 'size', 'quantity', 'error']].copy()
+                invalid_display.columns = ['카테고리', '품명', '사이즈', '수량', '오류']
+                st.dataframe(invalid_display, use_container_width=True)
+            if not changes.empty:
+                diff_display = changes[['category', 'item_name', 'size', 'current', 'incoming', 'after']].copy()
+                diff_display.insert(0, '상태', changes['id'].isna().map({True: "🆕 신규", False: "✏️ 추가"}))
+                diff_display.columns = ['상태', '카테고리', '품명', '사이즈', '현재', '입고', '입고 후']
+                st.dataframe(diff_display, use_container_width=True, hide_index=True)
+                if st.button(f"📥 {len(changes)}개 품목 일괄 입고 확정", use_container_width=True):
+                    if commit_inbound(lines, changes) is not None:
+                        st.success(f"✅ {len(changes)}개 품목 {int(changes['incoming'].sum())}개 입고 및 저장 완료!")
+
 # 2. 지급 페이지 (구글 시트)
+@timed()
 def page_distribute():
     st.markdown("### 🎁 물품 지급 (DISTRIBUTE)")
-    if not sh: return
+    if not db: return
+    if st.radio("지급 방식", ["개별 지급", "일괄 지급"], horizontal=True) == "일괄 지급":
+        page_distribute_bulk()
+        return
     c1, c2 = st.columns([1, 2])
     
     with c1:
         st.markdown("#### 1. 대상 선택")
         t_type = st.radio("구분", ["선수", "스텝"], horizontal=True)
-        df_people = get_data("players" if t_type == "선수" else "staff")
+        p_table = "players" if t_type == "선수" else "staff"
+        df_people = get_data(p_table, ['id', 'name', 'back_number' if t_type == "선수" else 'role', 'top_size', 'bottom_size', 'shoe_size'])
         names = df_people['name'].tolist() if not df_people.empty and 'name' in df_people.columns else []
         t_name = st.selectbox("이름", names if names else ["없음"])
         
         if t_name != "없음" and not df_people.empty:
             person = df_people[df_people['name'] == t_name].iloc[0]
-            img_html = ""
-            try:
-                img_data = str(person['image_path'])
-                if len(img_data) > 50:
-                    img_html = f'<img src="data:image/jpeg;base64,{img_data}" style="width:120px; height:120px; object-fit:cover; border-radius:50%; border:3px solid white; margin-bottom:10px;">'
-                else:
-                    img_html = '<div style="width:120px; height:120px; background-color:#ddd; border-radius:50%; border:3px solid white; display:flex; align-items:center; justify-content:center; margin:0 auto 10px auto; color:black; font-weight:bold; font-size:40px;">🏐</div>'
-            except:
+            img_uri = image_data_uri(get_image_ref(p_table, person['id']), "avatar")
+            if img_uri:
+                img_html = f'<img src="{img_uri}" style="width:120px; height:120px; object-fit:cover; border-radius:50%; border:3px solid white; margin-bottom:10px;">'
+            else:
                 img_html = '<div style="width:120px; height:120px; background-color:#ddd; border-radius:50%; border:3px solid white; display:flex; align-items:center; justify-content:center; margin:0 auto 10px auto; color:black; font-weight:bold; font-size:40px;">🏐</div>'
 
             role_or_num = person['back_number'] if t_type == "선수" else person['role']
@@ -368,7 +2911,7 @@ def page_distribute():
     with c2:
         st.markdown("#### 2. 물품 선택")
         c_filter = st.selectbox("카테고리 선택", CATEGORIES)
-        inv_df = get_data("inventory")
+        inv_df = get_data("inventory", ['id', 'category', 'item_name', 'size', 'quantity'])
         if not inv_df.empty and 'quantity' in inv_df.columns:
             inv_df = inv_df[inv_df['quantity'] > 0]
             if c_filter != "전체보기": inv_df = inv_df[inv_df['category'] == c_filter]
@@ -383,34 +2926,93 @@ def page_distribute():
                 
                 if st.button("🚀 지급 확정", use_container_width=True):
                     sel_row = size_opts[s_size_opt]
-                    current_qty = int(sel_row['quantity'])
-                    if current_qty >= qty:
-                        update_data("inventory", sel_row['id'], "quantity", current_qty - qty)
-                        add_data("logs", [datetime.now().strftime("%Y-%m-%d"), t_type, t_name, s_item, sel_row['size'], qty])
+                    log_row = [datetime.now().strftime("%Y-%m-%d"), t_type, t_name, s_item, sel_row['size'], qty]
+                    if issue_stock(sel_row['id'], qty, log_row) is not None:
                         st.success("지급 완료 및 저장됨!")
                         st.rerun()
-                    else: st.error("재고 부족")
         else:
             st.warning("재고 데이터가 없습니다.")
 
+@timed()
+def page_distribute_bulk():
+    # 여러 명에게 여러 품목을 각자 사이즈로 한 번에 지급 (재고 수정 한 번 + 기록 추가 한 번)
+    c1, c2 = st.columns([1, 2])
+    with c1:
+        st.markdown("#### 1. 대상 선택")
+        t_type = st.radio("구분", ["선수", "스텝"], horizontal=True, key="bulk_type")
+        p_table = "players" if t_type == "선수" else "staff"
+        df_people = get_data(p_table, ['id', 'name'] + list(SIZE_FIELDS.values()))
+        names = df_people['name'].tolist() if not df_people.empty and 'name' in df_people.columns else []
+        if st.checkbox("전체 선택", key="bulk_all"):
+            picked = names
+        else:
+            picked = st.multiselect("이름", names, key="bulk_names")
+        qty = st.number_input("1인당 수량", 1, value=1, key="bulk_qty")
+
+    with c2:
+        st.markdown("#### 2. 물품 선택")
+        inv_df = get_data("inventory", ['id', 'category', 'item_name', 'size', 'quantity'])
+        if inv_df.empty or 'quantity' not in inv_df.columns:
+            st.warning("재고 데이터가 없습니다.")
+            return
+        items = inv_df[['category', 'item_name']].drop_duplicates()
+        labels = {f"[{c}] {n}": (c, n) for c, n in items.itertuples(index=False)}
+        picked_items = st.multiselect("품목", list(labels), key="bulk_items")
+        size_by = {}
+        for label in picked_items:
+            default = "신발" if labels[label][0] == "신발" else "상의"
+            size_by[label] = st.selectbox(f"{label} 사이즈 기준", list(SIZE_FIELDS), index=list(SIZE_FIELDS).index(default), key=f"bulk_size_{label}")
+
+    if not picked or not picked_items:
+        st.info("대상과 품목을 고르면 지급 계획이 표시됩니다.")
+        return
+
+    people = df_people[df_people['name'].isin(picked)]
+    plan = bulk_issue_plan(people, [labels[l] + (SIZE_FIELDS[size_by[l]],) for l in picked_items], inv_df, qty)
+
+    shortfall = plan[plan['short']].groupby(STOCK_KEYS, as_index=False).agg(need=('demand', 'first'), available=('available', 'first'), people=('name', 'count'))
+    if not shortfall.empty:
+        st.error(f"⚠️ 재고가 부족한 품목/사이즈 {len(shortfall)}개 (해당 {int(shortfall['people'].sum())}건은 빼고 지급됩니다)")
+        shortfall_display = shortfall[['category', 'item_name', 'size', 'need', 'available']].copy()
+        shortfall_display.columns = ['구분', '품명', '사이즈', '필요', '재고']
+        st.dataframe(shortfall_display, use_container_width=True, hide_index=True)
+
+    plan_display = plan[['name', 'item_name', 'size', 'quantity', 'available']].copy()
+    plan_display['상태'] = plan['short'].map({True: "❌ 부족", False: "✅"})
+    plan_display.columns = ['이름', '품명', '사이즈', '수량', '재고', '상태']
+    st.dataframe(plan_display, use_container_width=True, hide_index=True)
+
+    ok = plan[~plan['short']]
+    if not ok.empty and st.button(f"🚀 {len(ok)}건 일괄 지급 확정", use_container_width=True):
+        today = datetime.now().strftime("%Y-%m-%d")
+        lines = [(int(r.id), int(r.quantity), [today, t_type, r.name, r.item_name, r.size, int(r.quantity)]) for r in ok.itertuples(index=False)]
+        if issue_stock_bulk(lines) is not None:
+            st.success(f"{len(lines)}건 지급 완료 및 저장됨!")
+            st.rerun()
+
 # 3. 재고 현황 (구글 시트)
+@timed()
 def page_inventory():
     st.markdown("### 📦 재고 현황")
-    if not sh: return
+    if not db: return
     c1, c2 = st.columns(2)
     v_cat = c1.selectbox("카테고리", CATEGORIES)
     search = c2.text_input("검색")
-    df = get_data("inventory")
+    df = get_data("inventory", ['id', 'category', 'item_name', 'size', 'quantity'])
     if not df.empty and 'quantity' in df.columns:
-        df_view = df[df['quantity'] > 0]
+        # 잔여수량은 시트 수량 (지급/입고/수정이 모두 이 값을 바꿈). 장부 재고는 옆에 참고로 보여주고,
+        # 둘이 다른 품목은 아래 '장부 대조'에서 확인/맞춤. 입고 기록이 없는 옛 품목은 장부 재고가 비어 있음
+        df_view = _stock_keys(df, STOCK_KEYS).merge(get_stock_view()[STOCK_KEYS + ['stock']], on=STOCK_KEYS, how='left')
+        df_view['stock'] = df_view['stock'].astype('Int64')
+        df_view = df_view[df_view['quantity'] > 0]
         if v_cat != "전체보기":
             df_view = df_view[df_view['category'] == v_cat]
         if search:
-            df_view = df_view[df_view['item_name'].str.contains(search)]
+            df_view = df_view[df_view['id'].isin(search_ids("inventory", 'item_name', search))]
         
         # [한글 컬럼명으로 변경하여 표시]
-        df_display = df_view[['id', 'category', 'item_name', 'size', 'quantity']].copy()
-        df_display.columns = ['ID', '구분', '품명', '사이즈', '잔여수량']
+        df_display = df_view[['id', 'category', 'item_name', 'size', 'quantity', 'stock']].copy()
+        df_display.columns = ['ID', '구분', '품명', '사이즈', '잔여수량', '장부 재고']
         
         event = st.dataframe(df_display, use_container_width=True, hide_index=True, on_select="rerun", selection_mode="multi-row", key="inv_event")
         
@@ -430,15 +3032,29 @@ def page_inventory():
                 new_name = st.text_input("품명", value=curr_row['item_name'])
                 new_qty = st.number_input("수량", value=int(curr_row['quantity']))
                 if st.button("수정 저장"):
-                    update_data("inventory", sel_id, "item_name", new_name)
-                    update_data("inventory", sel_id, "quantity", new_qty)
+                    update_row("inventory", sel_id, {"item_name": new_name, "quantity": new_qty})
                     st.success("수정 완료")
                     st.rerun()
 
+    with st.expander("🔎 장부 대조"):
+        report = reconcile_stock()
+        if report.empty:
+            st.caption("시트 수량과 입고/지급 기록이 모두 일치합니다.")
+        else:
+            report_display = report[['id', 'category', 'item_name', 'size', 'quantity', 'stock', 'diff']].copy()
+            report_display.columns = ['ID', '구분', '품명', '사이즈', '시트 수량', '장부 재고', '차이']
+            st.dataframe(report_display, use_container_width=True, hide_index=True)
+            fixable = report[report['id'].notna() & report['stock'].notna() & (report['stock'] >= 0)]
+            if not fixable.empty and st.button(f"장부 기준으로 {len(fixable)}개 품목 수량 맞추기"):
+                update_rows("inventory", {int(r['id']): {"quantity": int(r['stock'])} for _, r in fixable.iterrows()})
+                st.success("수정 완료")
+                st.rerun()
+
 # 4. 선수 명단 (구글 시트)
+@timed()
 def page_players():
     st.markdown("### 🏐 선수 명단")
-    if not sh: return
+    if not db: return
     with st.expander("➕ 선수 등록"):
         c1, c2, c3 = st.columns(3)
         p_num = c1.text_input("배번")
@@ -449,11 +3065,11 @@ def page_players():
         p_bot = c5.selectbox("하의", CLOTHES_SIZES)
         p_img = st.file_uploader("프로필 사진", type=['png', 'jpg'])
         if st.button("저장"):
-            img_b64 = image_to_base64(p_img)
-            add_data("players", [p_name, p_num, p_top, p_bot, p_shoe, img_b64])
+            img_ref = save_image(p_img)
+            add_data("players", [p_name, p_num, p_top, p_bot, p_shoe, img_ref])
             st.rerun()
             
-    df = get_data("players")
+    df = get_data("players", ['id', 'back_number', 'name', 'top_size', 'bottom_size', 'shoe_size'])
     if not df.empty:
         # [한글 컬럼명 표시]
         df_display = df[['id','back_number','name','top_size','bottom_size','shoe_size']].copy()
@@ -471,10 +3087,12 @@ def page_players():
             edit_target = st.selectbox("수정 대상", df['name'].tolist())
             if edit_target:
                 p_curr = df[df['name'] == edit_target].iloc[0]
-                try:
-                    if str(p_curr['image_path']) and len(str(p_curr['image_path'])) > 50:
-                        st.image(BytesIO(base64.b64decode(p_curr['image_path'])), width=100)
-                except: pass
+                img_ref = get_image_ref("players", p_curr['id'])
+                img_bytes = load_image(img_ref, "preview")
+                if img_bytes:
+                    st.image(img_bytes, width=100)
+                    if st.checkbox("🔍 원본 보기", key="epimg"):
+                        st.image(load_image(img_ref, "full"))
                 
                 ec1, ec2, ec3 = st.columns(3)
                 e_num = ec1.text_input("배번", value=str(p_curr['back_number']), key="epn")
@@ -489,21 +3107,18 @@ def page_players():
                 e_img = st.file_uploader("사진 변경 (선택)", type=['png', 'jpg'], key="p_edit_img")
 
                 if st.button("수정 완료", key="bpe"):
-                    update_data("players", p_curr['id'], "back_number", e_num)
-                    update_data("players", p_curr['id'], "name", e_name)
-                    update_data("players", p_curr['id'], "shoe_size", e_shoe)
-                    update_data("players", p_curr['id'], "top_size", e_top)
-                    update_data("players", p_curr['id'], "bottom_size", e_bot)
+                    changes = {"back_number": e_num, "name": e_name, "shoe_size": e_shoe, "top_size": e_top, "bottom_size": e_bot}
                     if e_img:
-                        new_img = image_to_base64(e_img)
-                        update_data("players", p_curr['id'], "image_path", new_img)
+                        changes["image_path"] = save_image(e_img)
+                    update_row("players", p_curr['id'], changes)
                     st.success("수정 완료")
                     st.rerun()
 
 # 5. 스텝 명단 (구글 시트)
+@timed()
 def page_staff():
     st.markdown("### 👔 스텝 명단")
-    if not sh: return
+    if not db: return
     with st.expander("➕ 스텝 등록"):
         c1, c2 = st.columns(2)
         s_role = c1.selectbox("직책", STAFF_ROLES)
@@ -514,11 +3129,11 @@ def page_staff():
         s_shoe = c5.selectbox("신발", SHOE_SIZES, key="ss")
         s_img = st.file_uploader("프로필 사진", type=['png', 'jpg'])
         if st.button("저장"):
-            img_b64 = image_to_base64(s_img)
-            add_data("staff", [s_name, s_role, s_top, s_bot, s_shoe, img_b64])
+            img_ref = save_image(s_img)
+            add_data("staff", [s_name, s_role, s_top, s_bot, s_shoe, img_ref])
             st.rerun()
 
-    df = get_data("staff")
+    df = get_data("staff", ['id', 'role', 'name', 'top_size', 'bottom_size', 'shoe_size'])
     if not df.empty:
         # [한글 컬럼명 표시]
         df_display = df[['id','role','name','top_size','bottom_size','shoe_size']].copy()
@@ -536,10 +3151,12 @@ def page_staff():
             edit_target = st.selectbox("수정 대상", df['name'].tolist())
             if edit_target:
                 s_curr = df[df['name'] == edit_target].iloc[0]
-                try:
-                    if str(s_curr['image_path']) and len(str(s_curr['image_path'])) > 50:
-                        st.image(BytesIO(base64.b64decode(s_curr['image_path'])), width=100)
-                except: pass
+                img_ref = get_image_ref("staff", s_curr['id'])
+                img_bytes = load_image(img_ref, "preview")
+                if img_bytes:
+                    st.image(img_bytes, width=100)
+                    if st.checkbox("🔍 원본 보기", key="esimg"):
+                        st.image(load_image(img_ref, "full"))
                 
                 ec1, ec2 = st.columns(2)
                 e_role = ec1.selectbox("직책", STAFF_ROLES, index=STAFF_ROLES.index(s_curr['role']) if s_curr['role'] in STAFF_ROLES else 0, key="esr")
@@ -553,57 +3170,96 @@ def page_staff():
                 e_img = st.file_uploader("사진 변경 (선택)", type=['png', 'jpg'], key="s_img_edit")
 
                 if st.button("수정 완료", key="bse"):
-                    update_data("staff", s_curr['id'], "role", e_role)
-                    update_data("staff", s_curr['id'], "name", e_name)
-                    update_data("staff", s_curr['id'], "top_size", e_top)
-                    update_data("staff", s_curr['id'], "bottom_size", e_bot)
-                    update_data("staff", s_curr['id'], "shoe_size", e_shoe)
+                    changes = {"role": e_role, "name": e_name, "top_size": e_top, "bottom_size": e_bot, "shoe_size": e_shoe}
                     if e_img:
-                        new_img = image_to_base64(e_img)
-                        update_data("staff", s_curr['id'], "image_path", new_img)
+                        changes["image_path"] = save_image(e_img)
+                    update_row("staff", s_curr['id'], changes)
                     st.success("수정 완료")
                     st.rerun()
 
 # 6. 전체 내역 (구글 시트)
+HISTORY_PAGE_SIZES = [50, 100, 200]
+# 날짜 컬럼은 datetime 으로 들고 있으므로 표에는 날짜만 보이게
+DATE_COLUMN = st.column_config.DateColumn(format="YYYY-MM-DD")
+
+def history_view(table_name, columns, labels, name_col, name_label, noun):
+    # 필터를 먼저 적용하고, id 기준 키셋 페이지네이션으로 현재 페이지만 화면에 보냄.
+    # 페이지를 넘겨도 선택한 id 는 페이지별로 기억했다가 합쳐서 삭제
+    key = f"hist_{table_name}"
+    f1, f2, f3 = st.columns([2, 2, 1])
+    search = f1.text_input(name_label, key=f"{key}_search")
+    period = f2.date_input("기간", value=(), key=f"{key}_period")
+    page_size = f3.selectbox("페이지당", HISTORY_PAGE_SIZES, key=f"{key}_size")
+
+    # 기간을 정하면 그 기간에 걸친 보관 파일만 읽음 (안 정하면 보관분 전체)
+    start, end = (pd.Timestamp(d) for d in period) if len(period) == 2 else (None, None)
+    df = history_frame(table_name, columns, start, end)
+    if df.empty:
+        return
+    # get_data/history_frame 이 이미 id 내림차순으로 정렬해서 줌
+    if search:
+        df = df[df['id'].isin(search_history(table_name, name_col, search, start, end))]
+    if start is not None:
+        df = df[(df['date'] >= start) & (df['date'] <= end)]
+
+    # 필터가 바뀌면 첫 페이지로 돌아가고 선택도 비움 (표 key 의 gen 을 올려서 위젯 선택 상태까지 초기화)
+    signature = (search, tuple(period), page_size)
+    if key not in st.session_state:
+        st.session_state[key] = {"signature": signature, "cursors": [], "selected": {}, "rows": {}, "gen": 0}
+    state = st.session_state[key]
+    if state["signature"] != signature:
+        state.update(signature=signature, cursors=[], selected={}, rows={}, gen=state["gen"] + 1)
+
+    cursor = state["cursors"][-1] if state["cursors"] else None
+    start_pos = 0 if cursor is None else int((-df['id']).searchsorted(-cursor, side="right"))
+    page = df.iloc[start_pos:start_pos + page_size]
+
+    # [한글 컬럼명]
+    df_disp = page[columns].copy()
+    df_disp.columns = labels
+    event = st.dataframe(df_disp, use_container_width=True, hide_index=True, on_select="rerun", selection_mode="multi-row", key=f"{key}_table_{state['gen']}_{cursor}",
+                         column_config={"날짜": DATE_COLUMN})
+    # 페이지를 옮기면 표가 선택 없이 새로 만들어지므로, 표의 선택이 직전 실행과 달라졌을 때만 이 페이지 선택을 바꿈
+    # (다시 돌아온 페이지에서 아무것도 안 누르면 전에 고른 id 가 그대로 남음)
+    rows = list(event.selection.rows)
+    if rows != state["rows"].get(cursor, []):
+        state["rows"][cursor] = rows
+        state["selected"][cursor] = df_disp.iloc[rows]['ID'].tolist()
+    selected = [row_id for ids in state["selected"].values() for row_id in ids]
+
+    n1, n2, n3 = st.columns([1, 3, 1])
+    if n1.button("◀ 이전", disabled=not state["cursors"], key=f"{key}_prev", use_container_width=True):
+        state["cursors"].pop()
+        state["rows"] = {}
+        st.rerun()
+    n2.caption(f"{start_pos + 1 if len(page) else 0}-{start_pos + len(page)} / 전체 {len(df)}건")
+    if n3.button("다음 ▶", disabled=start_pos + page_size >= len(df), key=f"{key}_next", use_container_width=True):
+        state["cursors"].append(page['id'].iloc[-1])
+        state["rows"] = {}
+        st.rerun()
+
+    if selected:
+        if st.button(f"🗑️ 선택한 {len(selected)}개 {noun} 삭제", type="primary", key=f"{key}_delete"):
+            def after_delete():
+                state.update(selected={}, rows={}, gen=state["gen"] + 1)
+                st.rerun()
+            confirm_delete_dialog(selected, table_name, after_delete)
+
+@timed()
 def page_history():
     st.markdown("### 📋 전체 내역")
-    if not sh: return
+    if not db: return
     t1, t2 = st.tabs(["📤 지급 내역", "📥 입고 내역"])
     with t1:
-        search = st.text_input("이름 검색")
-        df_out = get_data("logs")
-        if not df_out.empty:
-            if search: df_out = df_out[df_out['target_name'].str.contains(search)]
-            df_out = df_out.sort_values(by='id', ascending=False)
-            
-            # [한글 컬럼명]
-            df_disp = df_out[['id','date','target_name','item_name','size','quantity']].copy()
-            df_disp.columns = ['ID','날짜','이름','품명','사이즈','수량']
-
-            event_out = st.dataframe(df_disp, use_container_width=True, hide_index=True, on_select="rerun", selection_mode="multi-row")
-            if len(event_out.selection.rows) > 0:
-                ids = df_disp.iloc[event_out.selection.rows]['ID'].tolist()
-                if st.button(f"🗑️ 선택한 {len(ids)}개 지급 내역 삭제", type="primary"):
-                    confirm_delete_dialog(ids, "logs", st.rerun)
-
+        history_view("logs", ['id', 'date', 'target_name', 'item_name', 'size', 'quantity'], ['ID', '날짜', '이름', '품명', '사이즈', '수량'], 'target_name', "이름 검색", "지급 내역")
     with t2:
-        df_in = get_data("inbound_logs")
-        if not df_in.empty:
-            df_in = df_in.sort_values(by='id', ascending=False)
-            # [한글 컬럼명]
-            df_disp_in = df_in[['id','date','item_name','size','quantity']].copy()
-            df_disp_in.columns = ['ID','날짜','품명','사이즈','수량']
-
-            event_in = st.dataframe(df_disp_in, use_container_width=True, hide_index=True, on_select="rerun", selection_mode="multi-row")
-            if len(event_in.selection.rows) > 0:
-                ids = df_disp_in.iloc[event_in.selection.rows]['ID'].tolist()
-                if st.button(f"🗑️ 선택한 {len(ids)}개 입고 내역 삭제", type="primary"):
-                    confirm_delete_dialog(ids, "inbound_logs", st.rerun)
+        history_view("inbound_logs", ['id', 'date', 'item_name', 'size', 'quantity'], ['ID', '날짜', '품명', '사이즈', '수량'], 'item_name', "품명 검색", "입고 내역")
 
 # 7. 비고
+@timed()
 def page_memo():
     st.markdown("### 📝 비고")
-    if not sh: return
+    if not db: return
     with st.form("memo"):
         c1, c2 = st.columns([1,2])
         d = c1.date_input("날짜"); c = c2.selectbox("구분", MEMO_CATS)
@@ -613,7 +3269,7 @@ def page_memo():
             st.rerun()
     df = get_data("memos")
     if not df.empty:
-        st.dataframe(df.sort_values(by='id', ascending=False), use_container_width=True, hide_index=True)
+        st.dataframe(df.sort_values(by='id', ascending=False), use_container_width=True, hide_index=True, column_config={"date": DATE_COLUMN})
 
 if __name__ == "__main__":
     main()
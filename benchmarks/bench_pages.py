@@ -0,0 +1,144 @@
+# 화면 조작 하나마다 시트 API 를 몇 번 부르고, 몇 바이트를 주고받고, 얼마나 걸리는지 측정.
+# fake_gspread 워크북(SKYWALKERS_BACKEND=fake)을 100 / 1만 / 10만 행으로 만들어서
+# Streamlit AppTest 로 입고, 지급, 재고 현황, 전체 내역 화면을 차례로 조작함.
+#
+#   python benchmarks/bench_pages.py                      # 100, 10000, 100000 행
+#   python benchmarks/bench_pages.py --rows 10000 --latency-ms 80 --json bench.json
+#
+# 같은 조작의 호출 수/바이트가 커밋 전후로 늘었으면 회귀.
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import fake_gspread
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1.errors import AppTestError
+
+DEFAULT_ROWS = [100, 10_000, 100_000]
+
+def _button(at, label):
+    for button in at.button:
+        if button.label == label:
+            return button
+    raise LookupError(f"'{label}' 버튼이 화면에 없음")
+
+def _widget(widgets, label):
+    for widget in widgets:
+        if widget.label == label:
+            return widget
+    raise LookupError(f"'{label}' 입력칸이 화면에 없음")
+
+def _menu(label):
+    return lambda at: _button(at, label).click().run()
+
+def _inbound(at):
+    _widget(at.text_input, "품명 (예: 반팔티)").input("반팔")
+    _widget(at.selectbox, "사이즈").select("L")
+    _button(at, "📥 입고 확정").click().run()
+
+def _issue(at):
+    _button(at, "🚀 지급 확정").click().run()
+
+def _search(at):
+    _widget(at.text_input, "이름 검색").input("ㄱㅁㅅ").run()
+
+def _next_page(at):
+    # 지급 내역 탭의 '다음' 버튼
+    at.button(key="hist_logs_next").click().run()
+
+# (이름, 조작). 앞 단계에서 바뀐 화면/캐시 상태를 이어받음
+SCENARIO = [
+    ("재고 현황: 첫 화면", _menu("📦 재고 현황")),
+    ("재고 현황: 다시 그리기", lambda at: at.run()),
+    ("물품 입고: 화면 열기", _menu("📥 물품 입고")),
+    ("물품 입고: 입고 확정", _inbound),
+    ("지급 하기: 화면 열기", _menu("🎁 지급 하기")),
+    ("지급 하기: 지급 확정", _issue),
+    ("재고 현황: 입고/지급 후", _menu("📦 재고 현황")),
+    ("전체 내역: 화면 열기", _menu("📋 전체 내역")),
+    ("전체 내역: 다음 페이지", _next_page),
+    ("전체 내역: 이름 검색", _search),
+]
+
+def run_size(rows, latency_ms, quota, timeout):
+    os.environ.update({
+        "SKYWALKERS_BACKEND": "fake",
+        "SKYWALKERS_FAKE_ROWS": str(rows),
+        "SKYWALKERS_FAKE_LATENCY_MS": str(latency_ms),
+        "SKYWALKERS_FAKE_QUOTA": str(quota),
+    })
+    # 크기마다 새 워크북, 새 캐시로 시작
+    st.cache_resource.clear()
+    st.cache_data.clear()
+    fake_gspread.WORKBOOKS.clear()
+
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=timeout)
+    started = time.perf_counter()
+    at.run()
+    book = fake_gspread.WORKBOOKS["skywalkers_db"]
+    results = [_result(rows, "시작 화면", book.take_stats(), time.perf_counter() - started, at)]
+    for name, action in SCENARIO:
+        started = time.perf_counter()
+        try:
+            action(at)
+        except (LookupError, AppTestError) as e:
+            results.append(_result(rows, name, book.take_stats(), time.perf_counter() - started, at, str(e)))
+            continue
+        results.append(_result(rows, name, book.take_stats(), time.perf_counter() - started, at))
+    return results
+
+def _result(rows, name, stats, wall, at, error=None):
+    if error is None and len(at.exception):
+        error = at.exception[0].message
+    return {
+        "rows": rows,
+        "interaction": name,
+        "calls": sum(stats["calls"].values()),
+        "calls_by_method": dict(stats["calls"]),
+        "bytes_sent": stats["bytes_sent"],
+        "bytes_received": stats["bytes_received"],
+        "api_ms": round(stats["api_sec"] * 1000, 1),
+        "wall_ms": round(wall * 1000, 1),
+        "api_errors": {str(code): n for code, n in stats["errors"].items()},
+        "error": error,
+    }
+
+def print_table(results):
+    print(f"{'행 수':>7}  {'조작':<22} {'호출':>4} {'보냄 KB':>9} {'받음 KB':>9} {'API ms':>8} {'전체 ms':>8}  호출 내역")
+    for r in results:
+        methods = ", ".join(f"{m}×{n}" for m, n in sorted(r["calls_by_method"].items()))
+        note = f"  ⚠️ {r['error']}" if r["error"] else ""
+        print(f"{r['rows']:>7}  {r['interaction']:<22} {r['calls']:>4} {r['bytes_sent'] / 1024:>9.1f} {r['bytes_received'] / 1024:>9.1f} "
+              f"{r['api_ms']:>8.1f} {r['wall_ms']:>8.1f}  {methods}{note}")
+
+def main():
+    parser = argparse.ArgumentParser(description="fake 워크북으로 화면 조작별 시트 API 비용 측정")
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS, help="지급/입고 기록 행 수 (여러 개)")
+    parser.add_argument("--latency-ms", type=float, default=0, help="API 호출마다 줄 지연")
+    parser.add_argument("--quota", type=int, default=0, help="fake 워크북의 분당 읽기/쓰기 한도 (0 이면 없음)")
+    parser.add_argument("--timeout", type=float, default=600, help="AppTest 한 번 실행 제한 시간(초)")
+    parser.add_argument("--json", help="결과를 JSON 으로 저장할 경로")
+    args = parser.parse_args()
+
+    # 앱 쪽 호출 제한(분당 60회)은 실제 시트 한도용이라 측정할 때는 풂. 한도 동작은 --quota 로 봄
+    os.environ.setdefault("SKYWALKERS_READS_PER_MIN", "100000")
+    os.environ.setdefault("SKYWALKERS_WRITES_PER_MIN", "100000")
+    os.chdir(ROOT)
+
+    results = []
+    for rows in args.rows:
+        results += run_size(rows, args.latency_ms, args.quota, args.timeout)
+    print_table(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 1 if any(r["error"] for r in results) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
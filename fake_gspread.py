@@ -0,0 +1,370 @@
+# 구글 시트 없이 앱을 돌려보고 API 비용을 재기 위한 메모리 워크북.
+# 앱이 쓰는 gspread Spreadsheet/Worksheet 메서드만 같은 모양으로 흉내 내고,
+# 호출마다 지연(latency)을 주고, 분당 읽기/쓰기 한도를 넘기면 실제 API 처럼 429 APIError 를 냄.
+# 호출 수/주고받은 바이트/API 에서 보낸 시간은 stats 에 쌓임 (SKYWALKERS_BACKEND=fake, benchmarks/bench_pages.py)
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+
+import gspread
+from gspread.utils import a1_to_rowcol, column_letter_to_index, numericise_all, rowcol_to_a1
+
+class _QuotaResponse:
+    # APIError 가 읽는 requests.Response 의 일부만
+    status_code = 429
+    text = "Quota exceeded"
+
+    def json(self):
+        return {"error": {"code": 429, "message": "Quota exceeded for quota metric 'Read/Write requests'", "status": "RESOURCE_EXHAUSTED"}}
+
+class Cell:
+    def __init__(self, row, col, value):
+        self.row = row
+        self.col = col
+        self.value = value
+
+def _text(value):
+    # 시트에는 화면에 보이는 값(문자열)으로 저장됨. 10.0 처럼 정수인 실수는 "10"
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def _size(payload):
+    return len(json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8"))
+
+def _split_range(name):
+    # "'logs'!A2:C" -> ("logs", "A2", "C"), "B5" -> (None, "B5", "B5"), "'logs'" -> ("logs", None, None)
+    if "!" not in name and name.startswith("'"):
+        return name[1:-1].replace("''", "'"), None, None
+    title, _, cells = name.rpartition("!")
+    title = title.strip("'").replace("''", "'") or None
+    if not cells:
+        return title, None, None
+    first, _, last = cells.partition(":")
+    return title, first, last or first
+
+def _bounds(first, last):
+    # A1 범위 양 끝 -> (행0, 열0, 행1, 열1), 1부터. 열/행이 빠진 쪽은 끝까지
+    m0 = re.fullmatch(r"([A-Za-z]*)(\d*)", first)
+    m1 = re.fullmatch(r"([A-Za-z]*)(\d*)", last)
+    r0 = int(m0[2]) if m0[2] else 1
+    c0 = column_letter_to_index(m0[1].upper()) if m0[1] else 1
+    r1 = int(m1[2]) if m1[2] else None
+    c1 = column_letter_to_index(m1[1].upper()) if m1[1] else None
+    return r0, c0, r1, c1
+
+class FakeWorksheet:
+    def __init__(self, book, title, rows, sheet_id):
+        self.book = book
+        self.title = title
+        self.id = sheet_id
+        self.rows = [[_text(v) for v in row] for row in rows]
+
+    @property
+    def row_count(self):
+        return len(self.rows)
+
+    def _call(self, kind, name, request, fn, measure=_size):
+        return self.book._call(kind, name, request, fn, measure)
+
+    # --- 읽기 ---
+    def _values(self, first=None, last=None):
+        # 실제 API 처럼 각 행 끝의 빈 칸과 끝쪽 빈 행은 잘라서 줌
+        if first is None:
+            r0, c0, r1, c1 = 1, 1, None, None
+        else:
+            r0, c0, r1, c1 = _bounds(first, last)
+        out = []
+        for row in self.rows[r0 - 1:r1]:
+            cells = row[c0 - 1:c1]
+            while cells and cells[-1] == "":
+                cells.pop()
+            out.append(cells)
+        while out and not out[-1]:
+            out.pop()
+        return out
+
+    def _range(self, name):
+        _, first, last = _split_range(name)
+        return self._values(first, last)
+
+    def get_all_values(self):
+        def run():
+            values = self._values()
+            width = max((len(r) for r in values), default=0)
+            return [r + [""] * (width - len(r)) for r in values]
+        return self._call("read", "get_all_values", None, run)
+
+    def get_all_records(self, head=1):
+        def run():
+            values = self._values()
+            if len(values) < head:
+                return []
+            keys = values[head - 1]
+            return [dict(zip(keys, numericise_all(r + [""] * (len(keys) - len(r))))) for r in values[head:]]
+        return self._call("read", "get_all_records", None, run)
+
+    def get(self, range_name=None, **kwargs):
+        return self._call("read", "get", range_name, lambda: self._range(range_name) if range_name else self._values())
+
+    def batch_get(self, ranges, **kwargs):
+        return self._call("read", "batch_get", ranges, lambda: [self._range(r) for r in ranges])
+
+    def row_values(self, row, **kwargs):
+        return self._call("read", "row_values", row, lambda: (self._values(f"A{row}", f"{row}") or [[]])[0])
+
+    def col_values(self, col, **kwargs):
+        def run():
+            values = [r[col - 1] if len(r) >= col else "" for r in self.rows]
+            while values and values[-1] == "":
+                values.pop()
+            return values
+        return self._call("read", "col_values", col, run)
+
+    def acell(self, label, **kwargs):
+        def run():
+            row, col = a1_to_rowcol(label)
+            return Cell(row, col, self._cell(row, col))
+        return self._call("read", "acell", label, run, lambda cell: _size(cell.value))
+
+    def find(self, query, in_row=None, in_column=None, case_sensitive=True):
+        def run():
+            for r, row in enumerate(self.rows, start=1):
+                if in_row is not None and r != in_row:
+                    continue
+                for c, value in enumerate(row, start=1):
+                    if in_column is not None and c != in_column:
+                        continue
+                    if value == str(query) or (not case_sensitive and value.lower() == str(query).lower()):
+                        return Cell(r, c, value)
+            return None
+        return self._call("read", "find", [query, in_row, in_column], run, lambda cell: _size(cell and [cell.row, cell.col, cell.value]))
+
+    # --- 쓰기 ---
+    def _cell(self, row, col):
+        return self.rows[row - 1][col - 1] if row <= len(self.rows) and col <= len(self.rows[row - 1]) else ""
+
+    def _set(self, row, col, value):
+        while len(self.rows) < row:
+            self.rows.append([])
+        cells = self.rows[row - 1]
+        while len(cells) < col:
+            cells.append("")
+        cells[col - 1] = _text(value)
+
+    def _write(self, first, values):
+        r0, c0 = a1_to_rowcol(first)
+        for i, row in enumerate(values):
+            for j, value in enumerate(row):
+                self._set(r0 + i, c0 + j, value)
+
+    def _append(self, values):
+        # 마지막 데이터 행 다음부터 씀. 응답의 updatedRange 로 몇 번째 행에 붙었는지 알려줌
+        last = len(self.rows)
+        while last and not any(self.rows[last - 1]):
+            last -= 1
+        del self.rows[last:]
+        start = last + 1
+        for row in values:
+            self.rows.append([_text(v) for v in row])
+        width = max((len(r) for r in values), default=1)
+        end = start + len(values) - 1
+        return {"spreadsheetId": self.book.id, "updates": {
+            "updatedRange": f"'{self.title}'!A{start}:{rowcol_to_a1(end, width)}",
+            "updatedRows": len(values),
+        }}
+
+    def append_row(self, values, **kwargs):
+        return self._call("write", "append_row", values, lambda: self._append([values]))
+
+    def append_rows(self, values, **kwargs):
+        return self._call("write", "append_rows", values, lambda: self._append(values))
+
+    def update_cell(self, row, col, value):
+        return self._call("write", "update_cell", [row, col, value], lambda: self._set(row, col, value))
+
+    def update(self, values=None, range_name=None, **kwargs):
+        # gspread 6 순서 (values, range_name). 예전 순서 (range_name, values) 도 받아줌
+        if isinstance(values, str):
+            values, range_name = range_name, values
+        _, first, _ = _split_range(range_name or "A1")
+        return self._call("write", "update", [range_name, values], lambda: self._write(first, values))
+
+    def batch_update(self, data, **kwargs):
+        def run():
+            for item in data:
+                _, first, _ = _split_range(item["range"])
+                self._write(first, item["values"])
+        return self._call("write", "batch_update", data, run)
+
+    def delete_rows(self, start_index, end_index=None):
+        def run():
+            del self.rows[start_index - 1:end_index or start_index]
+        return self._call("write", "delete_rows", [start_index, end_index], run)
+
+class FakeSpreadsheet:
+    def __init__(self, title, tables, latency=0.0, reads_per_min=0, writes_per_min=0):
+        # tables: {시트 이름: [헤더, 행, ...]}. latency: 호출마다 기다릴 초. *_per_min: 0 이면 한도 없음
+        self.title = title
+        self.id = f"fake-{title}"
+        self.latency = latency
+        self.quota = {"read": reads_per_min, "write": writes_per_min}
+        self.recent = {"read": deque(), "write": deque()}
+        self.lock = threading.RLock()
+        self.sheets = {}
+        for sheet_id, (name, rows) in enumerate(tables.items()):
+            self.sheets[name] = FakeWorksheet(self, name, rows, sheet_id)
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {"calls": Counter(), "bytes_sent": 0, "bytes_received": 0, "api_sec": 0.0, "errors": Counter()}
+
+    def take_stats(self):
+        # 지금까지 쌓인 통계를 돌려주고 0 부터 다시 셈
+        with self.lock:
+            stats = self.stats
+            self.reset_stats()
+        return stats
+
+    def _admit(self, kind):
+        limit = self.quota[kind]
+        if not limit:
+            return
+        now = time.monotonic()
+        recent = self.recent[kind]
+        while recent and now - recent[0] >= 60:
+            recent.popleft()
+        if len(recent) >= limit:
+            raise gspread.exceptions.APIError(_QuotaResponse())
+        recent.append(now)
+
+    def _call(self, kind, name, request, fn, measure=_size):
+        # measure: 응답 크기를 재는 함수 (워크시트 객체처럼 JSON 이 아닌 결과용)
+        started = time.perf_counter()
+        received = 0
+        try:
+            with self.lock:
+                self._admit(kind)
+            if self.latency:
+                # 네트워크 흔들림처럼 ±20%
+                time.sleep(self.latency * random.uniform(0.8, 1.2))
+            with self.lock:
+                result = fn()
+            received = measure(result)
+            return result
+        except gspread.exceptions.APIError as e:
+            with self.lock:
+                self.stats["errors"][e.code] += 1
+            raise
+        finally:
+            with self.lock:
+                self.stats["calls"][name] += 1
+                self.stats["api_sec"] += time.perf_counter() - started
+                self.stats["bytes_sent"] += _size(request) if request is not None else 0
+                self.stats["bytes_received"] += received
+
+    def worksheet(self, title):
+        def run():
+            if title not in self.sheets:
+                raise gspread.exceptions.WorksheetNotFound(title)
+            return self.sheets[title]
+        return self._call("read", "worksheet", title, run, lambda ws: _size([ws.title, ws.id]))
+
+    def worksheets(self):
+        return self._call("read", "worksheets", None, lambda: list(self.sheets.values()), lambda sheets: _size([[ws.title, ws.id] for ws in sheets]))
+
+    def values_batch_get(self, ranges, params=None):
+        def run():
+            value_ranges = []
+            for name in ranges:
+                title, first, last = _split_range(name)
+                if title not in self.sheets:
+                    raise gspread.exceptions.WorksheetNotFound(title)
+                entry = {"range": name, "majorDimension": "ROWS"}
+                values = self.sheets[title]._values(first, last)
+                if values:
+                    entry["values"] = values
+                value_ranges.append(entry)
+            return {"spreadsheetId": self.id, "valueRanges": value_ranges}
+        return self._call("read", "values_batch_get", ranges, run)
+
+    def batch_update(self, body):
+        def run():
+            by_id = {ws.id: ws for ws in self.sheets.values()}
+            replies = []
+            for request in body["requests"]:
+                if "updateCells" in request:
+                    spec = request["updateCells"]
+                    ws = by_id[spec["start"]["sheetId"]]
+                    for i, row in enumerate(spec["rows"]):
+                        for j, cell in enumerate(row["values"]):
+                            value = next(iter(cell.get("userEnteredValue", {"stringValue": ""}).values()))
+                            ws._set(spec["start"]["rowIndex"] + 1 + i, spec["start"]["columnIndex"] + 1 + j, value)
+                elif "appendCells" in request:
+                    spec = request["appendCells"]
+                    ws = by_id[spec["sheetId"]]
+                    ws._append([[next(iter(cell.get("userEnteredValue", {"stringValue": ""}).values())) for cell in row["values"]] for row in spec["rows"]])
+                elif "deleteDimension" in request:
+                    spec = request["deleteDimension"]["range"]
+                    ws = by_id[spec["sheetId"]]
+                    del ws.rows[spec["startIndex"]:spec["endIndex"]]
+                else:
+                    raise NotImplementedError(f"fake_gspread: {next(iter(request))} 요청은 지원하지 않음")
+                replies.append({})
+            return {"spreadsheetId": self.id, "replies": replies}
+        return self._call("write", "batch_update", body, run)
+
+# --- 예시 데이터 ---
+SAMPLE_ITEMS = [
+    ("하계용품", "반팔", ["S", "M", "L", "XL", "2XL"]),
+    ("하계용품", "반바지", ["M", "L", "XL"]),
+    ("동계용품", "롱패딩", ["L", "XL", "2XL", "3XL"]),
+    ("연습복", "트레이닝복", ["M", "L", "XL"]),
+    ("유니폼", "홈유니폼", ["M", "L", "XL", "2XL"]),
+    ("양말", "양말", ["Free"]),
+    ("신발", "운동화", ["260", "265", "270", "275", "280", "285", "290"]),
+]
+SAMPLE_NAMES = ["김민수", "이준호", "박지훈", "최현우", "정우진", "강동현", "조성민", "윤재원", "장태양", "임하늘"]
+
+def sample_tables(rows, seed=0):
+    # 지급/입고 기록이 rows 행인 워크북. 품목은 rows 의 1% (최소 SAMPLE_ITEMS 한 벌), 선수 30명, 스텝 8명
+    rng = random.Random(seed)
+    variants = [(cat, name, size) for cat, name, sizes in SAMPLE_ITEMS for size in sizes]
+    n_items = max(len(variants), rows // 100)
+    inventory = [["id", "date", "category", "item_name", "size", "quantity", "image_path"]]
+    for i in range(n_items):
+        cat, name, size = variants[i % len(variants)]
+        if i >= len(variants):
+            name = f"{name} {i // len(variants) + 1}차"
+        inventory.append([i + 1, "2025-03-01", cat, name, size, rng.randint(0, 200), ""])
+    players = [["id", "name", "back_number", "top_size", "bottom_size", "shoe_size", "image_path"]]
+    for i in range(30):
+        players.append([i + 1, f"{SAMPLE_NAMES[i % 10]}{i // 10 or ''}", i + 1, rng.choice(["M", "L", "XL", "2XL"]), rng.choice(["M", "L", "XL"]), rng.choice(["270", "275", "280", "285", "290"]), ""])
+    staff = [["id", "name", "role", "top_size", "bottom_size", "shoe_size", "image_path"]]
+    for i, role in enumerate(["감독", "수석코치", "코치", "코치", "트레이너", "트레이너", "전력분석관", "통역"]):
+        staff.append([i + 1, f"스텝{i + 1}", role, "L", "L", "275", ""])
+    logs = [["id", "date", "target_type", "target_name", "item_name", "size", "quantity"]]
+    inbound = [["id", "date", "category", "item_name", "size", "quantity"]]
+    for i in range(rows):
+        date = f"{2023 + i * 3 // max(rows, 1)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        cat, name, size = variants[rng.randrange(len(variants))]
+        logs.append([i + 1, date, "선수", players[rng.randint(1, 30)][1], name, size, rng.randint(1, 3)])
+        inbound.append([i + 1, date, cat, name, size, rng.randint(5, 50)])
+    memos = [["id", "date", "category", "content"], [1, "2025-03-01", "팀 연혁", "창단"]]
+    return {"players": players, "staff": staff, "inventory": inventory, "logs": logs, "inbound_logs": inbound, "memos": memos}
+
+# 같은 프로세스(같은 서버, 같은 벤치마크)에서는 이름별로 하나의 워크북을 같이 씀
+WORKBOOKS = {}
+_workbooks_lock = threading.Lock()
+
+def open_workbook(title, rows=100, latency=0.0, reads_per_min=0, writes_per_min=0):
+    with _workbooks_lock:
+        if title not in WORKBOOKS:
+            WORKBOOKS[title] = FakeSpreadsheet(title, sample_tables(rows), latency, reads_per_min, writes_per_min)
+        return WORKBOOKS[title]
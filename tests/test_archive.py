@@ -0,0 +1,53 @@
+# 보관 파일(ArchiveStore) 회귀 테스트. 앱을 fake 워크북으로 불러와서 클래스만 씀
+#
+#   python -m pytest -q tests
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture(scope="module")
+def app():
+    os.environ.setdefault("SKYWALKERS_BACKEND", "fake")
+    os.environ.setdefault("SKYWALKERS_FAKE_ROWS", "10")
+    cwd = os.getcwd()
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+    try:
+        import app
+    finally:
+        os.chdir(cwd)
+    return app
+
+def _logs(ids):
+    return pd.DataFrame({
+        "id": ids,
+        "date": pd.to_datetime(["2024-03-05"] * len(ids)),
+        "name": [f"선수{i}" for i in ids],
+        "item_name": ["반팔"] * len(ids),
+        "size": ["M"] * len(ids),
+        "quantity": [1] * len(ids),
+    })
+
+def test_delete_across_files_in_one_month(app, tmp_path):
+    # 같은 달에 파일이 둘(1~3, 4~6)일 때 두 파일에서 하나씩 지워도 나머지가 그대로 남아야 함
+    store = app.ArchiveStore(str(tmp_path))
+    assert store.append("logs", _logs([1, 2, 3])) == [1, 2, 3]
+    assert store.append("logs", _logs([4, 5, 6])) == [4, 5, 6]
+
+    assert sorted(store.delete("logs", [1, 4])) == [1, 4]
+
+    assert sorted(store.read("logs")['id']) == [2, 3, 5, 6]
+    info = store.table("logs")["partitions"]["2024-03"]
+    assert len(set(info["files"])) == len(info["files"]) == 2
+    assert info["rows"] == 4
+    assert store.count("logs") == 4
+    assert sorted(os.listdir(tmp_path / "logs" / "month=2024-03")) == sorted(info["files"])
+    assert list(store.is_archived("logs", [1, 2, 4, 5])) == [False, True, False, True]
+
+    # 색인을 새로 읽어도 같음 (다른 프로세스)
+    again = app.ArchiveStore(str(tmp_path))
+    assert sorted(again.read("logs")['id']) == [2, 3, 5, 6]